@@ -0,0 +1,277 @@
+"""Headless benchmark of the dashboard pipeline on synthetic metadata.
+
+    python benchmark.py --rows 10000 100000 1000000 --output benchmark.json
+
+For every size the synthetic table goes through the dataset cache like the real metadata. The benchmark then times:
+- building the app
+- the filter stages and figure callbacks for a few widget changes, through the Dash callback endpoint
+- each figure builder of `dash_graphs` on the full table
+The report is JSON; its `pipeline` part is what `/_metaminer/timings` of a running dashboard serves.
+"""
+import argparse
+import tempfile
+import json
+import time
+import sys
+import os
+import logging
+import pandas as pd
+import numpy as np
+from dash_graphs import Choropleth_map, Assembly_level_bar, Annotation_bar, Submission_year_line, Sequencing_technologies_scatter, Coverage_bar, ANI_scatter, Total_genes_hist, CDSs_hist, Non_coding_hist, Pseudogenes_hist, Isolation_source_treemap, N50L50_scatter
+from dataset_cache import DatasetCache, normalize_metadata
+from pipeline_timing import TIMINGS_ENDPOINT
+from dashboard import create_app, layout_values
+
+
+BENCHMARK_SIZES = [10000, 100000, 1000000]
+
+COUNTRIES = {
+    'United States': 'USA', 'China': 'CHN', 'India': 'IND', 'United Kingdom': 'GBR', 'Germany': 'DEU', 'France': 'FRA',
+    'Brazil': 'BRA', 'Japan': 'JPN', 'Australia': 'AUS', 'Canada': 'CAN', 'South Africa': 'ZAF', 'Kenya': 'KEN',
+}
+US_STATES = {'California': 'US-CA', 'Texas': 'US-TX', 'New York': 'US-NY', 'Florida': 'US-FL', 'Ohio': 'US-OH', 'Washington': 'US-WA'}
+SEQUENCING_TECHNOLOGIES = ['Illumina', 'Oxford Nanopore', 'PacBio', 'Illumina; Oxford Nanopore', 'Ion Torrent', 'Unknown']
+HOSTS = ['Hospital-associated', 'Animal-associated', 'Environment-associated', 'Laboratory-based', 'Unknown']
+TITLE_WORDS = [
+    'salmonella', 'enterica', 'escherichia', 'coli', 'klebsiella', 'pneumoniae', 'genome', 'sequencing', 'surveillance',
+    'outbreak', 'clinical', 'isolates', 'poultry', 'wastewater', 'antimicrobial', 'resistance', 'whole', 'hospital',
+    'food', 'soil', 'metagenome', 'project', 'national', 'public', 'health', 'typhimurium', 'carbapenemase', 'strain',
+]
+
+# widget changes replayed by the benchmark, each one on top of the previous ones
+SCENARIOS = [
+    ('initial', {}),
+    ('country', {('country-dropdown', 'value'): 'United States'}),
+    ('assembly_level', {('assembly-level-checklist', 'value'): ['Complete Genome', 'Chromosome']}),
+    ('submission_year', {('submission-year-slider', 'value'): [2015, 2023]}),
+    ('coverage', {('coverage-slider', 'value'): [50, 1000]}),
+    ('bioproject_search', {('bioproject-input', 'value'): 'salmonella, outbre~'}),
+    ('isolation_source', {('identified-host-dropdown', 'value'): ['Hospital-associated', 'Animal-associated']}),
+    ('world', {('country-dropdown', 'value'): 'World'}),
+]
+
+
+def weighted_choice(rng:np.random.Generator, values:list, n_rows:int, p_null:float = 0.0):
+    # a few values are frequent and most are rare, as in the real metadata
+    weights = 1 / np.arange(1, len(values) + 1)
+    choices = np.asarray(values, dtype=object)[rng.choice(len(values), size=n_rows, p=weights / weights.sum())]
+    choices[rng.random(n_rows) < p_null] = np.nan
+    return choices
+
+
+def with_nulls(rng:np.random.Generator, values:np.ndarray, p_null:float):
+    values = values.astype(float)
+    values[rng.random(len(values)) < p_null] = np.nan
+    return values
+
+
+def titles(rng:np.random.Generator, n_titles:int, prefix:str):
+    lengths = rng.integers(3, 10, size=n_titles)
+    return [f"{prefix} {' '.join(rng.choice(TITLE_WORDS, size=length))} {i}" for i, length in enumerate(lengths)]
+
+
+def synthetic_metadata(n_rows:int, seed:int = 0) -> pd.DataFrame:
+    """Normalized metadata with the real column schema and plausible value distributions."""
+    rng = np.random.default_rng(seed)
+
+    country = weighted_choice(rng, list(COUNTRIES), n_rows, p_null=0.1)
+    state_name = weighted_choice(rng, list(US_STATES), n_rows, p_null=0.3)
+    state_name[country != 'United States'] = np.nan
+
+    n50 = np.round(np.exp(rng.normal(11.5, 1.5, n_rows)))
+    total_genes = np.round(rng.normal(4500, 900, n_rows)).clip(300)
+
+    host = weighted_choice(rng, HOSTS, n_rows)
+    source_category = np.asarray([f'{h.split("-")[0]} category {i}' for h, i in zip(host, rng.integers(0, 4, n_rows))], dtype=object)
+    source = np.asarray([f'{c} / source {i}' for c, i in zip(source_category, rng.integers(0, 5, n_rows))], dtype=object)
+    sample = np.asarray([f'{s} / sample {i}' for s, i in zip(source, rng.integers(0, 3, n_rows))], dtype=object)
+    unknown = host == 'Unknown'
+    source_category[unknown] = source[unknown] = sample[unknown] = np.nan
+
+    df = pd.DataFrame({
+        'country_common_name': country,
+        'country_three_lettered_name': pd.Series(country).map(COUNTRIES).to_numpy(dtype=object),
+        'state_name': state_name,
+        'state_code': pd.Series(state_name).map(US_STATES).to_numpy(dtype=object),
+        'Assembly_level': weighted_choice(rng, ['Contig', 'Scaffold', 'Complete Genome', 'Chromosome'], n_rows),
+        'Annotation_category': weighted_choice(rng, ['NCBI RefSeq', 'GenBank', 'Others', 'No Annotation'], n_rows),
+        'Submission_year': rng.integers(2000, 2026, n_rows),
+        'Assmbly_atypical?': weighted_choice(rng, ['No', 'Yes'], n_rows),
+        'Assembly_status': weighted_choice(rng, ['current', 'suppressed'], n_rows),
+        'Categorized_sequencing_technologies': weighted_choice(rng, SEQUENCING_TECHNOLOGIES, n_rows, p_null=0.05),
+        'Coverage_Depth': with_nulls(rng, np.round(np.exp(rng.normal(4.5, 1.2, n_rows)), 1), 0.15),
+        'ANI_best_match_score': with_nulls(rng, np.round(100 - rng.gamma(1.0, 0.6, n_rows), 2).clip(80), 0.05),
+        'ANI_best_matched_assembly\'s_coverage': with_nulls(rng, np.round(100 - rng.gamma(2.0, 3.0, n_rows), 2).clip(20), 0.05),
+        'Contig_N50': n50,
+        'Contig_L50': np.maximum(1, np.round(5e6 / n50 / 4)),
+        'Total_genes': with_nulls(rng, total_genes, 0.1),
+        'Protein-coding_genes': with_nulls(rng, np.round(total_genes * 0.9), 0.1),
+        'Non-coding_genes': with_nulls(rng, np.round(rng.normal(110, 20, n_rows)).clip(0), 0.1),
+        'Pseudogenes': with_nulls(rng, np.round(rng.exponential(120, n_rows)), 0.1),
+        'Bioproject_title': np.asarray(titles(rng, max(n_rows // 20, 1), 'BioProject'), dtype=object)[rng.integers(0, max(n_rows // 20, 1), n_rows)],
+        'Biosample_title': np.asarray(titles(rng, max(n_rows // 3, 1), 'BioSample'), dtype=object)[rng.integers(0, max(n_rows // 3, 1), n_rows)],
+        'identified_host': host,
+        'source_category': source_category,
+        'source': source,
+        'sample': sample,
+    })
+    return normalize_metadata(df)
+
+
+class HeadlessDashboard:
+    """Replays widget changes against the Dash callback endpoint of an app, the way the browser would.
+
+    Like the Dash renderer, a change only fires the callbacks with a changed input, each of them once: a callback
+    waits while another pending callback can still change one of its inputs, and then runs with all of its changed
+    inputs together. A callback's own outputs do not fire it again.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.client = app.server.test_client()
+        self.values = layout_values(app.layout)
+
+        # the callback graph: the inputs and outputs of every callback, as 'id.property'
+        self.inputs = {output: {f"{i['id']}.{i['property']}" for i in callback['inputs']} for output, callback in app.callback_map.items()}
+        self.outputs = {output: set(output.strip('.').split('...')) for output in app.callback_map}
+        self.initial = [c['output'] for c in app._callback_list if c['output'] in self.inputs and not c.get('prevent_initial_call', app.config.prevent_initial_callbacks)]
+
+        # the properties each callback can change, directly or through the callbacks it fires
+        self.downstream = {}
+        for output in self.inputs:
+            reached, frontier = set(), set(self.outputs[output])
+            while frontier:
+                reached |= frontier
+                frontier = set().union(*[self.outputs[o] for o in self.inputs if o != output and self.inputs[o] & frontier]) - reached
+            self.downstream[output] = reached
+
+        # the callbacks fired by the last `change`, in order
+        self.fired = []
+
+    def call(self, output:str, changed:list):
+        callback = self.app.callback_map[output]
+        outputs = [{'id': o.split('.')[0], 'property': o.split('.')[1]} for o in output.strip('.').split('...')]
+        payload = {
+            'output': output,
+            'outputs': outputs if output.startswith('..') else outputs[0],
+            'inputs': [{'id': i['id'], 'property': i['property'], 'value': self.values.get((i['id'], i['property']))} for i in callback['inputs']],
+            'state': [{'id': s['id'], 'property': s['property'], 'value': self.values.get((s['id'], s['property']))} for s in callback['state']],
+            'changedPropIds': changed,
+        }
+
+        response = self.client.post('/_dash-update-component', json=payload)
+        if response.status_code == 204:
+            return []
+        if response.status_code != 200:
+            raise RuntimeError(f"Callback {output} failed with status {response.status_code}")
+
+        updated = []
+        for component_id, props in response.get_json()['response'].items():
+            for prop, value in props.items():
+                self.values[(component_id, prop)] = value
+                updated.append(f'{component_id}.{prop}')
+        return updated
+
+    def triggered(self, props, source:str = None) -> dict:
+        # the callbacks with one of `props` as an input, with the ones they have
+        return {output: inputs & set(props) for output, inputs in self.inputs.items() if output != source and inputs & set(props)}
+
+    def change(self, changes:dict):
+        """Sets widget values and runs the callbacks they fire; no changes is the initial page load."""
+        self.values.update(changes)
+        self.fired = []
+
+        if changes:
+            pending = self.triggered([f'{component_id}.{prop}' for component_id, prop in changes])
+        else:
+            pending = {output: set() for output in self.initial}
+
+        while pending:
+            ready = [output for output in pending if not any(other != output and self.inputs[output] & self.downstream[other] for other in pending)]
+            # callbacks that feed each other would wait forever; they run in the order they were added
+            for output in ready or list(pending)[:1]:
+                updated = self.call(output, sorted(pending.pop(output)))
+                self.fired.append(output)
+                for other, props in self.triggered(updated, source=output).items():
+                    pending.setdefault(other, set()).update(props)
+
+    def get_json(self, path:str):
+        return self.client.get(path).get_json()
+
+
+def figure_builders(df:pd.DataFrame):
+    # each builder on the full table, with the arguments of the initial page
+    return {
+        'Choropleth_map': lambda: Choropleth_map(df=df, selected_country='World'),
+        'Assembly_level_bar': lambda: Assembly_level_bar(df=df, selected_assembly_levels=['Complete Genome', 'Chromosome', 'Scaffold', 'Contig']),
+        'Annotation_bar': lambda: Annotation_bar(df=df, show_annotations_from=['GenBank', 'NCBI RefSeq', 'Others', 'No Annotation']),
+        'Submission_year_line': lambda: Submission_year_line(df=df),
+        'Sequencing_technologies_scatter': lambda: Sequencing_technologies_scatter(df=df, selected_sequencing_technologies=['All']),
+        'Coverage_bar': lambda: Coverage_bar(df=df),
+        'ANI_scatter': lambda: ANI_scatter(df=df),
+        'N50L50_scatter': lambda: N50L50_scatter(df=df),
+        'Total_genes_hist': lambda: Total_genes_hist(df=df),
+        'CDSs_hist': lambda: CDSs_hist(df=df),
+        'Non_coding_hist': lambda: Non_coding_hist(df=df),
+        'Pseudogenes_hist': lambda: Pseudogenes_hist(df=df),
+        'Isolation_source_treemap': lambda: Isolation_source_treemap(df=df),
+    }
+
+
+def benchmark_size(n_rows:int, seed:int, work_dir:str) -> dict:
+    report = {'rows': n_rows}
+
+    start = time.perf_counter()
+    cache = DatasetCache(os.path.join(work_dir, f'metadata_{n_rows}'))
+    cache.build(synthetic_metadata(n_rows, seed=seed))
+    df, summary = cache.load()
+    report['generate_and_cache_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    app = create_app(df, saving_file_path=work_dir, summary=summary)
+    report['create_app_s'] = time.perf_counter() - start
+
+    dashboard = HeadlessDashboard(app)
+    report['scenarios'] = {}
+    for name, changes in SCENARIOS:
+        start = time.perf_counter()
+        dashboard.change(changes)
+        report['scenarios'][name] = {'seconds': time.perf_counter() - start, 'callbacks': len(dashboard.fired), 'genome_count': dashboard.values.get(('genome-count', 'value'))}
+    report['pipeline'] = dashboard.get_json(TIMINGS_ENDPOINT)
+
+    report['figure_builders'] = {}
+    for name, build in figure_builders(df).items():
+        start = time.perf_counter()
+        figure = build()
+        seconds = time.perf_counter() - start
+        report['figure_builders'][name] = {'seconds': seconds, 'payload_bytes': len(figure.to_json())}
+
+    return report
+
+
+def main(argv:list = None):
+    parser = argparse.ArgumentParser(description='Headless benchmark of the MetaMiner dashboard on synthetic metadata.')
+    parser.add_argument('--rows', type=int, nargs='+', default=BENCHMARK_SIZES, help='table sizes to benchmark')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON report path (default: standard output)')
+    args = parser.parse_args(argv)
+
+    # the per-update debug messages would be part of the measurement
+    logging.getLogger().setLevel(logging.INFO)
+
+    with tempfile.TemporaryDirectory(prefix='metaminer-benchmark-') as work_dir:
+        reports = []
+        for n_rows in args.rows:
+            reports.append(benchmark_size(n_rows, args.seed, work_dir))
+            print(f"{n_rows} rows: app built in {reports[-1]['create_app_s']:.2f}s, scenarios took " + ', '.join(f"{name} {s['seconds']:.2f}s" for name, s in reports[-1]['scenarios'].items()), file=sys.stderr)
+
+    report = json.dumps({'sizes': reports}, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+import pandas as pd
+import numpy as np
+import threading
+import logging
+from collections import OrderedDict
+from filter_engine import FilterEngine
+
+
+# a categorical filter is only answered from the cubes if its column has at most this many values; filters on the
+# high-cardinality columns (e.g. a long list of sources) stay on the row filter
+MAX_FILTER_VALUES = 256
+
+# bytes of cubes kept per process; the least recently used cubes are dropped beyond it and rebuilt when asked for
+MAX_CUBE_BYTES = 64 << 20
+
+# bins of the coverage bar, closed on the left like `pd.cut(..., right=False)`
+COVERAGE_BIN_EDGES = [0, 50, 100, 200, 300, 400, 500, 700, 900, 1100, 1500, 3000, 5000, float('inf')]
+
+# gene-count histograms are drawn from this many fixed bins over the whole dataset
+HISTOGRAM_BINS = 60
+HISTOGRAM_COLUMNS = ['Total_genes', 'Protein-coding_genes', 'Non-coding_genes', 'Pseudogenes']
+
+
+def interval_codes(values:np.ndarray, edges:list) -> np.ndarray:
+    # bin i holds edges[i] <= value < edges[i + 1]; missing and out-of-range values get -1
+    codes = np.searchsorted(np.asarray(edges, dtype=float), values, side='right') - 1
+    return np.where((codes >= 0) & (codes < len(edges) - 1), codes, -1).astype(np.int16)
+
+def interval_labels(edges:list) -> np.ndarray:
+    # the labels `pd.cut(...).astype(str)` gives the same bins, e.g. '[0.0, 50.0)'
+    return np.asarray(pd.IntervalIndex.from_breaks(np.asarray(edges, dtype=float), closed='left').astype(str), dtype=object)
+
+def histogram_bins(values:np.ndarray, n_bins:int = HISTOGRAM_BINS) -> dict:
+    # equal bins of a round width (1, 2 or 5 times a power of ten) that cover every value
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return {'start': 0.0, 'width': 1.0, 'n_bins': 1}
+
+    low, high = float(values.min()), float(values.max())
+    raw_width = max((high - low) / n_bins, np.finfo(float).tiny)
+    magnitude = 10 ** np.floor(np.log10(raw_width))
+    width = float(next(step * magnitude for step in (1, 2, 5, 10) if step * magnitude >= raw_width))
+    start = float(np.floor(low / width) * width)
+    return {'start': start, 'width': width, 'n_bins': int((high - start) // width) + 1}
+
+def bin_codes(values:np.ndarray, bins:dict) -> np.ndarray:
+    codes = np.floor((values - bins['start']) / bins['width'])
+    codes = np.clip(np.nan_to_num(codes, nan=-1), -1, bins['n_bins'] - 1)
+    # the top edge of the last bin is inclusive; missing values stay at -1
+    return np.where(np.isnan(values), -1, codes).astype(np.int16)
+
+def bin_edges(bins:dict) -> np.ndarray:
+    return bins['start'] + bins['width'] * np.arange(bins['n_bins'] + 1)
+
+
+def first_appearances(ids:np.ndarray) -> np.ndarray:
+    # position of the first occurrence of each id of a `pd.factorize`, which numbers ids in order of appearance,
+    # so an id first occurs where the running maximum grows
+    if len(ids) == 0:
+        return np.empty(0, dtype=np.int64)
+    running = np.maximum.accumulate(ids)
+    return np.flatnonzero(np.r_[True, running[1:] > running[:-1]])
+
+
+class MarginalCube:
+    """Genome counts of the base rows per value combination ("cell") of a few dimensions.
+
+    Cells are numbered in the order of their first base row, so the values of a dimension over the selected cells
+    come out in the order `Selection.unique_codes` gives them.
+    """
+
+    def __init__(self, codes:dict, counts:np.ndarray, ranges:tuple = None):
+        self.codes = codes
+        self.counts = counts
+        self.ranges = ranges
+        self.nbytes = counts.nbytes + sum(code.nbytes for code in codes.values()) + sum(bound.nbytes for bound in ranges or ())
+
+    def cells(self, filters:dict) -> np.ndarray:
+        # `filters` maps a dimension to one flag per value (the last one for missing values)
+        selected = np.ones(len(self.counts), dtype=bool)
+        for dim, lookup in filters.items():
+            selected &= lookup[self.codes[dim]]
+        return selected
+
+
+class CountCubes:
+    """Small count cubes over a base selection of rows, one per chart and set of narrowed filters.
+
+    A filter state that keeps the base selection's continuous filters and only narrows a few low-cardinality
+    categorical ones selects whole cells of a cube over those columns and the columns a chart groups by, so its
+    counts are sums over a few cells instead of a pass over the rows. Cubes are built on first use and kept in an
+    LRU bounded by `max_bytes`. The callbacks of a threaded server share the object, so the LRU and the lazily
+    added dimensions are only changed under `lock`.
+    """
+
+    def __init__(self, engine:FilterEngine, rows:np.ndarray, max_bytes:int = MAX_CUBE_BYTES, bins:dict = None):
+        self.engine = engine
+        self.rows = rows
+        self.n_rows = len(rows)
+        self.max_bytes = max_bytes
+
+        # per dimension: the code of every base row, the labels of the codes, and how `df.groupby` sorts the codes
+        self.codes = {}
+        self.labels = {}
+        self.dtypes = {}
+        self.ranks = {}
+        self.indexes = {}
+
+        # the bins of the gene-count histograms, shared with the row path when given
+        self.bins = bins if bins is not None else {col: histogram_bins(engine.numbers[col]) for col in HISTOGRAM_COLUMNS if col in engine.numbers}
+
+        self.cubes = OrderedDict()
+        self.lock = threading.Lock()
+
+    def dimension(self, dim:str):
+        with self.lock:
+            if dim not in self.codes:
+                self.add_dimension(dim)
+            return self.codes[dim], self.labels[dim]
+
+    def add_dimension(self, dim:str):
+        # binned measures are dimensions named '<column>_bin'
+        measure = dim[:-len('_bin')] if dim.endswith('_bin') else None
+        series = self.engine.df[dim] if measure is None else None
+        dtype = None
+        if measure == 'Coverage_Depth':
+            codes, labels = interval_codes(self.engine.numbers[measure], COVERAGE_BIN_EDGES), interval_labels(COVERAGE_BIN_EDGES)
+        elif measure is not None:
+            codes, labels = bin_codes(self.engine.numbers[measure], self.bins[measure]), bin_edges(self.bins[measure])[:-1]
+        elif dim in self.engine.codes:
+            codes, labels = self.engine.codes[dim], self.engine.categories[dim]
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            codes, labels = series.cat.codes.to_numpy(), np.asarray(series.cat.categories, dtype=object)
+        else:
+            codes, labels = pd.factorize(series.to_numpy(), use_na_sentinel=True)
+            labels = np.asarray(labels)
+
+        if series is not None and isinstance(series.dtype, pd.CategoricalDtype):
+            # `df.groupby` sorts a categorical column by its codes
+            dtype, rank = series.dtype, np.arange(len(labels))
+        else:
+            rank = np.empty(len(labels), dtype=np.int64)
+            rank[np.argsort(labels, kind='stable')] = np.arange(len(labels))
+
+        # code -1 (a missing value) picks the last slot, and sorts last
+        self.ranks[dim] = np.append(rank, len(labels))
+        self.dtypes[dim] = dtype
+        self.indexes[dim] = pd.Index(labels, dtype=object)
+        self.labels[dim] = labels
+        self.codes[dim] = codes[self.rows]
+
+    def cube(self, dims, ranges:str = None) -> MarginalCube:
+        key = (tuple(sorted(set(dims))), ranges)
+        with self.lock:
+            cube = self.cubes.get(key)
+            if cube is not None:
+                self.cubes.move_to_end(key)
+                return cube
+
+        # the cell of every base row, from the dimension codes combined one dimension at a time
+        cell_of_row = np.zeros(self.n_rows, dtype=np.int64)
+        for dim in key[0]:
+            codes, labels = self.dimension(dim)
+            cell_of_row, _ = pd.factorize(cell_of_row * (len(labels) + 1) + codes + 1)
+
+        first_row = first_appearances(cell_of_row)
+        counts = np.bincount(cell_of_row, minlength=len(first_row))
+
+        bounds = None
+        if ranges is not None:
+            values = pd.Series(self.engine.numbers[ranges][self.rows]).groupby(cell_of_row)
+            bounds = (values.min().to_numpy(), values.max().to_numpy())
+
+        cube = MarginalCube({dim: self.codes[dim][first_row] for dim in key[0]}, counts, bounds)
+        logging.debug(f"Count cube over {key[0]} built with {len(counts)} cells from {self.n_rows} rows.")
+
+        with self.lock:
+            self.cubes[key] = cube
+            while len(self.cubes) > 1 and sum(c.nbytes for c in self.cubes.values()) > self.max_bytes:
+                evicted, _ = self.cubes.popitem(last=False)
+                logging.debug(f"Evicted the count cube over {evicted[0]}.")
+        return cube
+
+    # the FilterEngine filters, as one flag per value of a dimension instead of one per row
+    def isin(self, dim:str, values) -> np.ndarray:
+        labels = self.dimension(dim)[1]
+        lookup = np.zeros(len(labels) + 1, dtype=bool)  # last slot is for missing values (code -1)
+
+        values = list(values)
+        wanted = [value for value in values if not pd.isnull(value)]
+        if len(wanted) < len(values):
+            lookup[-1] = True
+
+        found = self.indexes[dim].get_indexer(pd.Index(wanted, dtype=object))
+        lookup[found[found >= 0]] = True
+        return lookup
+
+    def equals(self, dim:str, value) -> np.ndarray:
+        if pd.isnull(value):
+            return np.zeros(len(self.dimension(dim)[1]) + 1, dtype=bool)
+        return self.isin(dim, [value])
+
+    def between(self, dim:str, low, high) -> np.ndarray:
+        labels = np.append(self.dimension(dim)[1].astype(float), np.nan)
+        return (labels >= low) & (labels <= high)
+
+    def filterable(self, dim:str) -> bool:
+        return len(self.dimension(dim)[1]) <= MAX_FILTER_VALUES
+
+    def narrows(self, dim:str, lookup:np.ndarray) -> bool:
+        # whether the filter drops any base row; the ones that do not are left out of the cubes
+        return not lookup[self.cube([dim]).codes[dim]].all()
+
+    def rows_of(self, filters:dict) -> np.ndarray:
+        """The base rows in `filters`, in their base order."""
+        selected = np.ones(self.n_rows, dtype=bool)
+        for dim, lookup in filters.items():
+            selected &= lookup[self.dimension(dim)[0]]
+        return self.rows[selected]
+
+    def count(self, filters:dict) -> int:
+        cube = self.cube(filters)
+        return int(cube.counts[cube.cells(filters)].sum())
+
+    def unique_codes(self, dim:str, filters:dict) -> np.ndarray:
+        # codes of `dim` in the selected rows, in order of their first row
+        cube = self.cube(list(filters) + [dim])
+        return pd.unique(cube.codes[dim][cube.cells(filters)])
+
+    def counts_by(self, columns:list, filters:dict, dropna:bool = True) -> pd.DataFrame:
+        """Genomes per value combination of `columns` in the selected rows, like `df.groupby(columns).size()` with `observed=True`."""
+        cube = self.cube(list(filters) + columns)
+        selected = cube.cells(filters)
+        codes = [cube.codes[col][selected] for col in columns]
+
+        # cells that differ in the filter dimensions only are added up
+        group_of_cell = np.zeros(len(codes[0]) if codes else 0, dtype=np.int64)
+        for col, code in zip(columns, codes):
+            group_of_cell, _ = pd.factorize(group_of_cell * (len(self.labels[col]) + 1) + code + 1)
+        first_cell = first_appearances(group_of_cell)
+        n_groups = len(first_cell)
+        totals = np.bincount(group_of_cell, weights=cube.counts[selected], minlength=n_groups).astype(np.int64)
+
+        group_codes = [code[first_cell] for code in codes]
+        if dropna:
+            present = np.all([code >= 0 for code in group_codes], axis=0) if columns else np.ones(n_groups, dtype=bool)
+            group_codes, totals = [code[present] for code in group_codes], totals[present]
+
+        order = np.lexsort([self.ranks[col][code] for col, code in zip(columns, group_codes)][::-1])
+        counts = pd.DataFrame({col: self.values(col, code[order]) for col, code in zip(columns, group_codes)})
+        counts['count'] = totals[order]
+        return counts
+
+    def values(self, dim:str, codes:np.ndarray):
+        # the column of a dimension, with the dtype the dataframe has for it
+        if self.dtypes[dim] is not None:
+            return pd.Categorical.from_codes(codes, dtype=self.dtypes[dim])
+        if (codes >= 0).all():
+            return self.labels[dim][codes]
+        # code -1 picks the appended NaN
+        return np.append(self.labels[dim].astype(object), np.nan)[codes]
+
+    def binned_counts(self, column:str, filters:dict):
+        """Genomes per bin of a binned measure in the selected rows, and the number of them in no bin (missing values)."""
+        dim = f'{column}_bin'
+        cube = self.cube(list(filters) + [dim])
+        selected = cube.cells(filters)
+        totals = np.bincount(cube.codes[dim][selected] + 1, weights=cube.counts[selected], minlength=len(self.labels[dim]) + 1).astype(np.int64)
+        return totals[1:], int(totals[0])
+
+    def value_range(self, column:str, filters:dict):
+        # (min, max) of a numeric column in the selected rows, NaN when no value is present
+        cube = self.cube(filters, ranges=column)
+        selected = cube.cells(filters)
+        lows, highs = cube.ranges[0][selected], cube.ranges[1][selected]
+        if np.isnan(lows).all():
+            return np.nan, np.nan
+        return float(np.nanmin(lows)), float(np.nanmax(highs))
@@ -1,20 +1,286 @@
 import plotly.express as px
+import plotly.graph_objects as go
 import pandas as pd
 import json
 import numpy as np
+from functools import lru_cache
+from count_cube import COVERAGE_BIN_EDGES, interval_codes, interval_labels, histogram_bins, bin_codes, bin_edges
+
+
+# scatter plots switch from drawing every genome (WebGL) to a binned 2-D density above this many visible points
+SCATTER_POINT_LIMIT = 20000
+DENSITY_BINS = 60
+
+# countries whose state geometry is kept in memory, and the simplification tolerance (degrees) of that geometry
+GEOMETRY_CACHE_SIZE = 16
+GEOMETRY_TOLERANCE = 0.01
 
 
 def remove_country_prefix(country):
     return country.split('-')[1]
 
-def Choropleth_map(df:pd.DataFrame, selected_country:str):
-    if selected_country == 'World':    
-        country_counts = df.groupby(['country_common_name', 'country_three_lettered_name']).size().reset_index(name='counts')
+def relayout_ranges(relayout_data:dict):
+    # returns (x_range, y_range) in axis units, (None, None) after an autorange reset, or None if the axes did not change
+    if not relayout_data:
+        return None
+
+    ranges = []
+    for axis in ['xaxis', 'yaxis']:
+        if f'{axis}.range[0]' in relayout_data and f'{axis}.range[1]' in relayout_data:
+            ranges.append([relayout_data[f'{axis}.range[0]'], relayout_data[f'{axis}.range[1]']])
+        elif f'{axis}.range' in relayout_data:
+            ranges.append(list(relayout_data[f'{axis}.range']))
+        else:
+            ranges.append(None)
+
+    if ranges == [None, None] and not any(key.endswith('.autorange') for key in relayout_data):
+        return None
+
+    return ranges[0], ranges[1]
+
+def visible_points(df:pd.DataFrame, x:str, y:str, x_range:list = None, y_range:list = None, log_x:bool = False):
+    plot_df = df[pd.notnull(df[x]) & pd.notnull(df[y])]
+
+    if log_x:
+        plot_df = plot_df[plot_df[x] > 0]
+
+    if x_range is not None:
+        x_values = np.log10(plot_df[x]) if log_x else plot_df[x]
+        plot_df = plot_df[(x_values >= x_range[0]) & (x_values <= x_range[1])]
+
+    if y_range is not None:
+        plot_df = plot_df[(plot_df[y] >= y_range[0]) & (plot_df[y] <= y_range[1])]
+
+    return plot_df
+
+def density_scatter_traces(plot_df:pd.DataFrame, x:str, y:str, x_range:list = None, y_range:list = None, log_x:bool = False):
+    # one trace per sequencing technology with a marker per occupied bin, so the payload depends on the bins, not on the genomes
+    x_values = plot_df[x].to_numpy(dtype=float)
+    y_values = plot_df[y].to_numpy(dtype=float)
+    if log_x:
+        x_values = np.log10(x_values)
+
+    def bin_edges(values, value_range):
+        low, high = value_range if value_range is not None else (values.min(), values.max())
+        if low == high:
+            low, high = low - 0.5, high + 0.5
+        return np.linspace(low, high, DENSITY_BINS + 1)
+
+    x_edges = bin_edges(x_values, x_range)
+    y_edges = bin_edges(y_values, y_range)
+
+    technologies = plot_df['Categorized_sequencing_technologies'].astype(object).fillna('Unknown').to_numpy()
+    technology_counts = {}
+    for technology in pd.unique(technologies):
+        selected = technologies == technology
+        technology_counts[technology], _, _ = np.histogram2d(x_values[selected], y_values[selected], bins=[x_edges, y_edges])
+
+    max_count = max(counts.max() for counts in technology_counts.values())
+    colors = px.colors.qualitative.Vivid
+    symbols = ['circle', 'diamond', 'square', 'x', 'cross', 'triangle-up']
+
+    traces = []
+    for i, (technology, counts) in enumerate(technology_counts.items()):
+        x_bins, y_bins = np.nonzero(counts)
+        bin_counts = counts[x_bins, y_bins].astype(int)
+
+        x_centers = (x_edges[x_bins] + x_edges[x_bins + 1]) / 2
+        y_centers = (y_edges[y_bins] + y_edges[y_bins + 1]) / 2
+        if log_x:
+            x_centers = np.power(10, x_centers)
+
+        traces.append(go.Scattergl(
+            x=x_centers,
+            y=y_centers,
+            mode='markers',
+            name=technology,
+            customdata=bin_counts,
+            hovertemplate=f'{technology}<br>Genomes in bin: %{{customdata}}<extra></extra>',
+            marker=dict(
+                size=np.round(4 + 16 * np.sqrt(bin_counts / max_count), 1),
+                color=colors[i % len(colors)],
+                symbol=symbols[i % len(symbols)],
+                opacity=0.6,
+            ),
+        ))
+
+    return traces
+
+def lod_scatter(df:pd.DataFrame, x:str, y:str, x_range:list = None, y_range:list = None, log_x:bool = False):
+    # up to SCATTER_POINT_LIMIT genomes every point is drawn and the browser zooms them; larger selections are cut to the range
+    if len(df) <= SCATTER_POINT_LIMIT:
+        plot_df = visible_points(df, x, y, log_x=log_x)
+    else:
+        plot_df = visible_points(df, x, y, x_range=x_range, y_range=y_range, log_x=log_x)
+
+    if len(plot_df) <= SCATTER_POINT_LIMIT:
+        figure = px.scatter(
+            plot_df,
+            x=x,
+            y=y,
+            symbol='Categorized_sequencing_technologies',
+            color='Categorized_sequencing_technologies',
+            color_discrete_sequence=px.colors.qualitative.Vivid,
+            render_mode='webgl',
+            template='plotly_white'
+        )
+    else:
+        figure = go.Figure(
+            data=density_scatter_traces(plot_df, x, y, x_range=x_range, y_range=y_range, log_x=log_x),
+            layout=dict(template='plotly_white'),
+        )
+        figure.update_layout(
+            title=dict(
+                text=f"{len(plot_df)} genomes binned by density (marker size ~ genomes per bin)",
+                x=0.5,
+                font=dict(size=12, color='#202A44'),
+            ),
+        )
+
+    if x_range is not None:
+        figure.update_xaxes(range=x_range)
+    if y_range is not None:
+        figure.update_yaxes(range=y_range)
+
+    return figure
+
+def simplify_ring(ring:list, tolerance:float):
+    # Douglas-Peucker; rings that would collapse are kept as they are
+    points = np.asarray(ring, dtype=float)
+    if len(points) <= 4:
+        return ring
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        inner = points[start + 1:end]
+        direction = points[end] - points[start]
+        length = np.hypot(direction[0], direction[1])
+        if length == 0:
+            distances = np.hypot(inner[:, 0] - points[start][0], inner[:, 1] - points[start][1])
+        else:
+            distances = np.abs(direction[0] * (inner[:, 1] - points[start][1]) - direction[1] * (inner[:, 0] - points[start][0])) / length
+
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            keep[start + 1 + farthest] = True
+            stack.append((start, start + 1 + farthest))
+            stack.append((start + 1 + farthest, end))
+
+    if keep.sum() < 4:
+        return ring
+    return np.round(points[keep], 4).tolist()
+
+def simplify_geometry(geometry:dict, tolerance:float):
+    if geometry['type'] == 'Polygon':
+        coordinates = [simplify_ring(ring, tolerance) for ring in geometry['coordinates']]
+    elif geometry['type'] == 'MultiPolygon':
+        coordinates = [[simplify_ring(ring, tolerance) for ring in polygon] for polygon in geometry['coordinates']]
+    else:
+        return geometry
+
+    return {'type': geometry['type'], 'coordinates': coordinates}
+
+@lru_cache(maxsize=GEOMETRY_CACHE_SIZE)
+def country_geometry(json_name:str):
+    # loaded once per country; returns the simplified display geojson and the states it contains
+    with open(f'./data/geojsons/{json_name}.json', encoding='utf-8') as f:
+        country_geojson = json.load(f)
+
+    features = [
+        {
+            'type': 'Feature',
+            'properties': {'ISO_1': state['properties']['ISO_1'], 'NAME_1': state['properties']['NAME_1']},
+            'geometry': simplify_geometry(state['geometry'], GEOMETRY_TOLERANCE),
+        }
+        for state in country_geojson['features']
+    ]
+
+    states = pd.DataFrame({
+        'state_name': [state['properties']['NAME_1'] for state in country_geojson['features']],
+        'state_code': [state['properties']['ISO_1'] for state in country_geojson['features']],
+    }).drop_duplicates(subset='state_code', keep='last')[['state_name', 'state_code']]
+
+    return {'type': 'FeatureCollection', 'features': features}, states
+
+# the choropleth is drawn from genome counts per country and state
+CHOROPLETH_COLUMNS = ['country_common_name', 'country_three_lettered_name', 'state_name', 'state_code']
+
+def choropleth_counts(df:pd.DataFrame, selected_country:str, counts:pd.DataFrame = None):
+    # `counts` per combination of CHOROPLETH_COLUMNS may come pre-aggregated (missing values kept)
+    if counts is None:
+        counts = df.groupby(CHOROPLETH_COLUMNS, observed=True, dropna=False).size().reset_index(name='count')
+    total = counts['count'].sum()
+
+    if selected_country == 'World':
+        country_counts = counts.groupby(['country_common_name', 'country_three_lettered_name'], observed=True)['count'].sum().reset_index(name='counts')
         country_counts['log_count'] = np.log1p(country_counts['counts'])
-        no_counts = len(df) - country_counts['counts'].sum()
+        no_counts = total - country_counts['counts'].sum()
+
+        return {
+            'counts': country_counts,
+            'locations': 'country_three_lettered_name',
+            'hover_name': 'country_common_name',
+            'color': 'log_count',
+            'title': f"Total isolates: {total}<br>Isolates without geographical data: {no_counts}",
+        }
+
+    filtered_data = counts[counts['country_common_name'] == selected_country]
+
+    state_counts = filtered_data.groupby(['state_name', 'state_code'], observed=True)['count'].sum().reset_index(name='counts')
+
+    no_count = filtered_data['count'].sum() - state_counts['counts'].sum()
+
+    title = f"Total isolates from {selected_country}: {filtered_data['count'].sum()}<br>Isolates without states' info.: {no_count}"
+
+    if selected_country == 'United States':
+        state_counts['counts'] = pd.to_numeric(state_counts['counts'], errors='coerce')
+
+        state_counts['state_code'] = state_counts['state_code'].apply(lambda x: remove_country_prefix(x) if '-' in x else x)
+
+        return {'counts': state_counts, 'locations': 'state_code', 'hover_name': 'state_name', 'color': 'counts', 'title': title}
+
+    json_name = filtered_data['country_three_lettered_name'].iloc[0] + '_states'
+
+    country_geojson, geo_states = country_geometry(json_name)
+
+    # states of the geojson without any isolate are added with a zero count in one step
+    zero_state_counts = geo_states[~geo_states['state_code'].isin(state_counts['state_code'])].assign(counts=0)
+
+    state_counts = pd.concat([state_counts.astype({'state_name': object, 'state_code': object}), zero_state_counts], ignore_index=True)
+
+    state_counts = state_counts.sort_values(by='state_name').reset_index(drop=True)
+
+    state_counts['counts'] = pd.to_numeric(state_counts['counts'], errors='coerce')
+
+    return {'counts': state_counts, 'locations': 'state_code', 'hover_name': 'state_name', 'color': 'counts', 'title': title, 'geojson': country_geojson}
+
+def Choropleth_update(df:pd.DataFrame, selected_country:str, counts:pd.DataFrame = None):
+    # the trace values of `Choropleth_map`, for updating a figure of the same country without sending its geometry again
+    counts = choropleth_counts(df, selected_country, counts=counts)
+    counts_df = counts['counts']
+
+    return {
+        'locations': counts_df[counts['locations']].tolist(),
+        'z': counts_df[counts['color']].tolist(),
+        'hovertext': counts_df[counts['hover_name']].tolist(),
+        'customdata': counts_df[['counts']].to_numpy().tolist(),
+        'title': counts['title'],
+    }
+
+def Choropleth_map(df:pd.DataFrame, selected_country:str, counts:pd.DataFrame = None):
+    counts = choropleth_counts(df, selected_country, counts=counts)
+
+    if selected_country == 'World':    
 
         fig = px.choropleth(
-            country_counts,
+            counts['counts'],
             locations='country_three_lettered_name',
             color='log_count',
             hover_name='country_common_name',
@@ -25,7 +291,7 @@ def Choropleth_map(df:pd.DataFrame, selected_country:str):
 
         fig.update_layout(
             title=dict(
-                text=f"Total isolates: {len(df)}<br>Isolates without geographical data: {no_counts}",
+                text=counts['title'],
                 xref='paper',
                 yref='container',
                 y = 0.05,
@@ -49,18 +315,8 @@ def Choropleth_map(df:pd.DataFrame, selected_country:str):
 
     elif selected_country == 'United States':
 
-        filtered_data = df[df['country_common_name'] == 'United States']
-
-        state_counts = filtered_data.groupby(['state_name', 'state_code']).size().reset_index(name='counts')
-
-        no_count = len(filtered_data) - state_counts['counts'].sum()
-
-        state_counts['counts'] = pd.to_numeric(state_counts['counts'], errors='coerce')
-
-        state_counts['state_code'] = state_counts['state_code'].apply(lambda x: remove_country_prefix(x) if '-' in x else x)
-
         fig = px.choropleth(
-            state_counts,
+            counts['counts'],
             locations='state_code',
             scope='usa',
             locationmode='USA-states',
@@ -73,7 +329,7 @@ def Choropleth_map(df:pd.DataFrame, selected_country:str):
 
         fig.update_layout(
             title=dict(
-                text=f"Total isolates from {selected_country}: {len(filtered_data)}<br>Isolates without states' info.: {no_count}",
+                text=counts['title'],
                 xref='paper',
                 yref='container',
                 y = 0.05,
@@ -87,46 +343,10 @@ def Choropleth_map(df:pd.DataFrame, selected_country:str):
         )
     
     else:
-        
-        filtered_data = df[df['country_common_name'] == selected_country]
-
-        # filtered_data.to_csv(f'filtered_data_{selected_country}.csv', index=False)
-
-        state_counts = filtered_data.groupby(['state_name', 'state_code']).size().reset_index(name='counts')
-
-        no_count = len(filtered_data) - state_counts['counts'].sum()
-
-        # state_counts.to_csv(f'{selected_country}_state_counts_before_adding_zeroes.csv', index=False)
-
-        json_name = filtered_data['country_three_lettered_name'].iloc[0] + '_states'
-
-        with open(f'./data/geojsons/{json_name}.json', encoding='utf-8') as f:
-            country_geojson = json.load(f)
-
-        geo_states = {state['properties']['ISO_1']: state['properties']['NAME_1'] for state in country_geojson['features']}
-
-        zero_state_counts = pd.DataFrame(columns=['state_name', 'state_code', 'counts'])
-
-        for iso, state_name in geo_states.items():
-            if not any(state_counts['state_code'] == iso):  
-                new_row = pd.DataFrame({
-                    'state_name': [state_name],
-                    'state_code': [iso],
-                    'counts': [0]
-                })
-                zero_state_counts = pd.concat([zero_state_counts, new_row], ignore_index=True)
-
-        state_counts = pd.concat([state_counts, zero_state_counts], ignore_index=True)
-
-        state_counts = state_counts.sort_values(by='state_name').reset_index(drop=True)
-
-        state_counts['counts'] = pd.to_numeric(state_counts['counts'], errors='coerce')
-
-        # state_counts.to_csv(f'{selected_country}_state_counts_after_adding_zeroes.csv', index=False)
 
         fig = px.choropleth(
-            state_counts,
-            geojson=country_geojson,
+            counts['counts'],
+            geojson=counts['geojson'],
             locations='state_code',
             hover_name='state_name',
             hover_data='counts',
@@ -138,7 +358,7 @@ def Choropleth_map(df:pd.DataFrame, selected_country:str):
 
         fig.update_layout(
             title=dict(
-                text=f"Total isolates from {selected_country}: {len(filtered_data)}<br>Isolates without states' info.: {no_count}",
+                text=counts['title'],
                 xref='paper',
                 yref='container',
                 y = 0.05,
@@ -160,9 +380,12 @@ def Choropleth_map(df:pd.DataFrame, selected_country:str):
 
     return fig
 
-def Assembly_level_bar(df:pd.DataFrame, selected_assembly_levels:list):
+def Assembly_level_bar(df:pd.DataFrame, selected_assembly_levels:list, counts:pd.DataFrame = None):
     assembly_levels = ['Contig', 'Scaffold', 'Chromosome', 'Complete Genome']
-    assembly_level_df = df.groupby('Assembly_level').size().reset_index(name='count')
+    # `counts` may come pre-aggregated (e.g. from the count cube); `df` is only grouped without them
+    if counts is None:
+        counts = df.groupby('Assembly_level', observed=True).size().reset_index(name='count')
+    assembly_level_df = counts
 
     assembly_level_df = assembly_level_df.set_index('Assembly_level')
     assembly_level_df = assembly_level_df.reindex(assembly_levels, fill_value=0).reset_index()
@@ -212,11 +435,13 @@ def Assembly_level_bar(df:pd.DataFrame, selected_assembly_levels:list):
 
     return fig
 
-def Annotation_bar(df:pd.DataFrame, show_annotations_from:list):
+def Annotation_bar(df:pd.DataFrame, show_annotations_from:list, counts:pd.DataFrame = None):
 
     annotaters = ['GenBank', 'NCBI RefSeq', 'Others', 'No Annotation']
 
-    annotation_df = df.groupby('Annotation_category').size().reset_index(name='count')
+    if counts is None:
+        counts = df.groupby('Annotation_category', observed=True).size().reset_index(name='count')
+    annotation_df = counts
     
 
     annotation_df = annotation_df.set_index('Annotation_category')
@@ -275,9 +500,11 @@ def Annotation_bar(df:pd.DataFrame, show_annotations_from:list):
 
     return fig
 
-def Submission_year_line(df:pd.DataFrame):
+def Submission_year_line(df:pd.DataFrame, counts:pd.DataFrame = None):
 
-    submissions_year_count = df.groupby('Submission_year').size().reset_index(name='count')
+    if counts is None:
+        counts = df.groupby('Submission_year', observed=True).size().reset_index(name='count')
+    submissions_year_count = counts
 
     fig = px.line(
     submissions_year_count,
@@ -319,9 +546,11 @@ def Submission_year_line(df:pd.DataFrame):
 
     return fig
 
-def Sequencing_technologies_scatter(df:pd.DataFrame, selected_sequencing_technologies:list):
+def Sequencing_technologies_scatter(df:pd.DataFrame, selected_sequencing_technologies:list, counts:pd.DataFrame = None):
     
-    plot_df = df.groupby(['Submission_year', 'Categorized_sequencing_technologies']).size().reset_index(name='count')
+    if counts is None:
+        counts = df.groupby(['Submission_year', 'Categorized_sequencing_technologies'], observed=True).size().reset_index(name='count')
+    plot_df = counts.copy()
     
     plot_df.sort_values(by='Categorized_sequencing_technologies', ascending=True)
 
@@ -364,19 +593,17 @@ def Sequencing_technologies_scatter(df:pd.DataFrame, selected_sequencing_technol
 
     return figure
 
-def Coverage_bar(df:pd.DataFrame):
+def Coverage_bar(df:pd.DataFrame, counts:np.ndarray = None, null_length:int = None):
 
-    bin_edges = [0, 50, 100, 200, 300, 400, 500, 700, 900, 1100, 1500, 3000, 5000, float('inf')]
-    bin_edges = np.unique(bin_edges)
+    # `counts` per bin of COVERAGE_BIN_EDGES and `null_length` (genomes in no bin) may come pre-aggregated
+    if counts is None:
+        codes = interval_codes(pd.to_numeric(df['Coverage_Depth'], errors='coerce').to_numpy(dtype=float, na_value=np.nan), COVERAGE_BIN_EDGES)
+        totals = np.bincount(codes + 1, minlength=len(COVERAGE_BIN_EDGES))
+        counts, null_length = totals[1:], int(totals[0])
 
-    df['Coverage_bin'] = pd.cut(df['Coverage_Depth'], bins=bin_edges, right=False)
+    full_length = int(counts.sum()) + null_length
 
-    full_length = len(df)
-    null_length = len(df[pd.isnull(df['Coverage_bin'])])
-
-    coverage_df = df.groupby('Coverage_bin', observed=False).size().reset_index(name='count')
-
-    coverage_df['Coverage_bin'] = coverage_df['Coverage_bin'].astype(str)
+    coverage_df = pd.DataFrame({'Coverage_bin': interval_labels(COVERAGE_BIN_EDGES), 'count': counts})
 
     figure = px.bar(
         coverage_df,
@@ -431,16 +658,14 @@ def Coverage_bar(df:pd.DataFrame):
 
     return figure
 
-def ANI_scatter(df:pd.DataFrame):
+def ANI_scatter(df:pd.DataFrame, x_range:list = None, y_range:list = None):
 
-    figure = px.scatter(
+    figure = lod_scatter(
         df,
         x='ANI_best_match_score',
         y='ANI_best_matched_assembly\'s_coverage',
-        symbol='Categorized_sequencing_technologies',
-        color='Categorized_sequencing_technologies',
-        color_discrete_sequence=px.colors.qualitative.Vivid,
-        template='plotly_white'  
+        x_range=x_range,
+        y_range=y_range,
     )
 
     figure.update_layout(
@@ -482,16 +707,15 @@ def ANI_scatter(df:pd.DataFrame):
 
     return figure
 
-def N50L50_scatter(df:pd.DataFrame):
+def N50L50_scatter(df:pd.DataFrame, x_range:list = None, y_range:list = None):
 
-    figure = px.scatter(
+    figure = lod_scatter(
         df,
         x='Contig_N50',
         y='Contig_L50',
-        symbol='Categorized_sequencing_technologies',
-        color='Categorized_sequencing_technologies',
-        color_discrete_sequence=px.colors.qualitative.Vivid,
-        template='plotly_white'
+        x_range=x_range,
+        y_range=y_range,
+        log_x=True,
     )
 
     figure.update_layout(
@@ -534,17 +758,60 @@ def N50L50_scatter(df:pd.DataFrame):
 
     return figure
 
-def Total_genes_hist(df:pd.DataFrame):
+def binned_histogram(counts:np.ndarray, bins:dict):
+    # bars of counted bins, with a box of the binned quartiles on top in place of a violin of every value
+    edges = bin_edges(bins)
+    centers = (edges[:-1] + edges[1:]) / 2
+
+    figure = go.Figure(
+        go.Bar(
+            x=centers,
+            y=counts,
+            width=bins['width'],
+            customdata=np.column_stack([edges[:-1], edges[1:]]),
+            hovertemplate='%{customdata[0]} - %{customdata[1]}: %{y}<extra></extra>',
+            marker=dict(color='#636efa', line=dict(width=0)),
+        )
+    )
 
-    full_length = len(df)
-    null_length = len(df[pd.isnull(df['Total_genes'])])
+    total = counts.sum()
+    if total:
+        cumulative = np.cumsum(counts)
+        q1, median, q3 = (centers[np.searchsorted(cumulative, q * total)] for q in (0.25, 0.5, 0.75))
+        filled = np.flatnonzero(counts)
+        figure.add_trace(
+            go.Box(
+                q1=[q1], median=[median], q3=[q3],
+                lowerfence=[edges[filled[0]]], upperfence=[edges[filled[-1] + 1]],
+                y=[0], orientation='h', yaxis='y2',
+                marker=dict(color='#636efa'),
+                hoverinfo='x',
+            )
+        )
 
-    figure = px.histogram(
-        df,
-        x='Total_genes',
-        marginal='violin',
+    figure.update_layout(
         template='plotly_white',
+        bargap=0,
+        yaxis=dict(domain=[0, 0.8]),
+        yaxis2=dict(domain=[0.85, 1], showticklabels=False, showgrid=False, zeroline=False),
     )
+    return figure
+
+def histogram_counts(values:pd.Series, bins:dict = None):
+    # genomes per bin (HISTOGRAM_BINS round bins over `values` unless `bins` are given) and genomes without a value
+    values = pd.to_numeric(values, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    if bins is None:
+        bins = histogram_bins(values)
+    totals = np.bincount(bin_codes(values, bins) + 1, minlength=bins['n_bins'] + 1)
+    return totals[1:], int(totals[0]), bins
+
+def Total_genes_hist(df:pd.DataFrame, counts:np.ndarray = None, null_length:int = None, bins:dict = None):
+
+    # counts per bin, from the count cube or from the rows of `df`, drawn with a box of the binned quartiles
+    if counts is None:
+        counts, null_length, bins = histogram_counts(df['Total_genes'], bins)
+    full_length = int(counts.sum()) + null_length
+    figure = binned_histogram(counts, bins)
 
     figure.update_layout(
         showlegend=False,
@@ -590,16 +857,13 @@ def Total_genes_hist(df:pd.DataFrame):
 
     return figure
 
-def CDSs_hist(df:pd.DataFrame):
-    full_length = len(df)
-    null_length = len(df[pd.isnull(df['Protein-coding_genes'])])
+def CDSs_hist(df:pd.DataFrame, counts:np.ndarray = None, null_length:int = None, bins:dict = None):
 
-    figure = px.histogram(
-        df,
-        x='Protein-coding_genes',
-        marginal='violin',
-        template='plotly_white',
-    )
+    # counts per bin, from the count cube or from the rows of `df`, drawn with a box of the binned quartiles
+    if counts is None:
+        counts, null_length, bins = histogram_counts(df['Protein-coding_genes'], bins)
+    full_length = int(counts.sum()) + null_length
+    figure = binned_histogram(counts, bins)
 
     figure.update_layout(
         showlegend=False,
@@ -645,16 +909,13 @@ def CDSs_hist(df:pd.DataFrame):
 
     return figure
 
-def Pseudogenes_hist(df:pd.DataFrame):
-    full_length = len(df)
-    null_length = len(df[pd.isnull(df['Pseudogenes'])])
+def Pseudogenes_hist(df:pd.DataFrame, counts:np.ndarray = None, null_length:int = None, bins:dict = None):
 
-    figure = px.histogram(
-        df,
-        x='Pseudogenes',
-        marginal='violin',
-        template='plotly_white',
-    )
+    # counts per bin, from the count cube or from the rows of `df`, drawn with a box of the binned quartiles
+    if counts is None:
+        counts, null_length, bins = histogram_counts(df['Pseudogenes'], bins)
+    full_length = int(counts.sum()) + null_length
+    figure = binned_histogram(counts, bins)
 
     figure.update_layout(
         showlegend=False,
@@ -700,16 +961,13 @@ def Pseudogenes_hist(df:pd.DataFrame):
 
     return figure
 
-def Non_coding_hist(df:pd.DataFrame):
-    full_length = len(df)
-    null_length = len(df[pd.isnull(df['Non-coding_genes'])])
+def Non_coding_hist(df:pd.DataFrame, counts:np.ndarray = None, null_length:int = None, bins:dict = None):
 
-    figure = px.histogram(
-        df,
-        x='Non-coding_genes',
-        marginal='violin',
-        template='plotly_white',
-    )
+    # counts per bin, from the count cube or from the rows of `df`, drawn with a box of the binned quartiles
+    if counts is None:
+        counts, null_length, bins = histogram_counts(df['Non-coding_genes'], bins)
+    full_length = int(counts.sum()) + null_length
+    figure = binned_histogram(counts, bins)
 
     figure.update_layout(
         showlegend=False,
@@ -755,7 +1013,14 @@ def Non_coding_hist(df:pd.DataFrame):
 
     return figure
 
-def Isolation_source_treemap(df:pd.DataFrame):
+def Isolation_source_treemap(df:pd.DataFrame, counts:pd.DataFrame = None):
+
+    # the treemap is drawn from genome counts per path, which may come pre-aggregated (missing values kept)
+    if counts is None:
+        counts = df.groupby(['identified_host', 'source_category', 'source', 'sample'], observed=True, dropna=False).size().reset_index(name='count')
+
+    # px.treemap groups by the path, which on categorical columns would include every unobserved combination
+    df = counts.astype({col: object for col in ['identified_host', 'source_category', 'source', 'sample']})
 
     if "Unknown" in df['identified_host'].unique():
         columns_of_interest = ['identified_host', 'source_category', 'source', 'sample']
@@ -763,7 +1028,8 @@ def Isolation_source_treemap(df:pd.DataFrame):
     else:
         columns_of_interest = ['source_category', 'source', 'sample']
         
-    df.loc[:, columns_of_interest] = df[columns_of_interest].where(pd.notnull(df[columns_of_interest]), "Unknown")
+    # as plain objects, since "Unknown" may not be one of the categories of a categorical column
+    df[columns_of_interest] = df[columns_of_interest].astype(object).where(pd.notnull(df[columns_of_interest]), "Unknown")
     
     custom_labels = {
         'identified_host': 'Host',
@@ -775,6 +1041,7 @@ def Isolation_source_treemap(df:pd.DataFrame):
     fig = px.treemap(
         df, 
         path=['identified_host', 'source_category', 'source', 'sample'],
+        values='count',
         width=1000,  
         height=900,
         color='sample',
@@ -1,13 +1,20 @@
-from dash import dcc, html, Dash, Input, Output, ctx
+from dash import dcc, html, Dash, Input, Output, State, ctx, no_update, Patch
 import dash_bootstrap_components as dbc
 import pandas as pd
 import numpy as np
-from dash_graphs import Choropleth_map, Assembly_level_bar, Annotation_bar, Submission_year_line, Sequencing_technologies_scatter, Coverage_bar, ANI_scatter, Total_genes_hist, CDSs_hist, Non_coding_hist, Pseudogenes_hist, Isolation_source_treemap, N50L50_scatter
+from dash_graphs import Choropleth_map, Choropleth_update, CHOROPLETH_COLUMNS, Assembly_level_bar, Annotation_bar, Submission_year_line, Sequencing_technologies_scatter, Coverage_bar, ANI_scatter, Total_genes_hist, CDSs_hist, Non_coding_hist, Pseudogenes_hist, Isolation_source_treemap, N50L50_scatter, relayout_ranges, SCATTER_POINT_LIMIT
+from filter_engine import FilterEngine
+from count_cube import CountCubes, HISTOGRAM_COLUMNS, histogram_bins
+from title_index import TitleIndex
+from export_jobs import ExportJobs, available_formats
+from pipeline_timing import PipelineTimings
+from selection_cache import SelectionCache, state_key, rows_key
+from dataset_cache import load_metadata, normalize_metadata, summarize_metadata
 import logging
 import dash_daq as daq
 import os
+import inspect
 import webbrowser
-from datetime import datetime
 import sys
 import logging
 
@@ -16,7 +23,22 @@ import logging
 logging.basicConfig(filename="dash.log", level=logging.DEBUG, format='%(asctime)s:%(levelname)s - %(message)s')
 
 
-def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
+def layout_values(component, values:dict = None) -> dict:
+    # (id, property) -> value of every component with an id, i.e. the values the page starts with
+    values = {} if values is None else values
+    if getattr(component, 'id', None) is not None:
+        for prop in component._prop_names:
+            if getattr(component, prop, None) is not None:
+                values[(component.id, prop)] = getattr(component, prop)
+
+    children = getattr(component, 'children', None)
+    for child in children if isinstance(children, (list, tuple)) else [children]:
+        if hasattr(child, '_prop_names'):
+            layout_values(child, values)
+    return values
+
+
+def create_app(df: pd.DataFrame, saving_file_path:str = None, summary:dict = None, job_status_dir:str = None, timings_panel:bool = False, use_count_cubes:bool = True):
     logging.info(f"Dash started!")
 
     if saving_file_path is None:
@@ -25,46 +47,27 @@ def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
     else:
         logging.debug(f"the current saving path: {saving_file_path}")
 
-    # for country drop-down
-    df_for_cdo = df[pd.notnull(df['country_common_name'])]
-
-    country_dropdown_options = df_for_cdo['country_common_name'].dropna().astype(str).unique()
-
-    country_dropdown_options.sort()
-    country_dropdown_options = np.insert(country_dropdown_options, 0, 'World')
-
-    # for sequencing technology drop-down
-    sequencing_technology_options = df['Categorized_sequencing_technologies'].dropna().astype(str).unique()
-    sequencing_technology_options.sort()
-    sequencing_technology_options = np.insert(sequencing_technology_options, 0, 'All')
-
-    # rename the column if source_y is present
-    if 'source_y' in df.columns:
-        logging.debug(f"`source_y` column is present in the dataframe. Renaming it to `source`")
-        df.rename(columns={'source_y': 'source'}, inplace=True)
-    elif 'source' in df.columns:
-        logging.debug(f"`source` column only is there in the dataframe.")
-
-    # for sliders making sure the columns are numeric
-    df['Coverage_Depth'] = pd.to_numeric(df['Coverage_Depth'], errors='coerce') # making sure this column is numeric
-
-    df['Total_genes'] = pd.to_numeric(df['Total_genes'], errors='coerce')
+    # the dataset cache ships the normalized metadata with its dropdown options and slider bounds precomputed
+    if summary is None:
+        normalize_metadata(df)
+        summary = summarize_metadata(df)
 
-    df['Protein-coding_genes'] = pd.to_numeric(df['Protein-coding_genes'], errors='coerce')
+    country_dropdown_options = summary['country_dropdown_options']
+    sequencing_technology_options = summary['sequencing_technology_options']
+    slider_bounds = summary['slider_bounds']
 
-    df['Non-coding_genes'] = pd.to_numeric(df['Non-coding_genes'], errors='coerce')
+    # column arrays for the callback filters, built once instead of copying the dataframe on every update
+    filter_engine = FilterEngine(df)
+    title_indexes = {col: TitleIndex(filter_engine.categories[col]) for col in ['Bioproject_title', 'Biosample_title']}
+    # fixed bins of the gene-count histograms over the whole dataset, so every selection is drawn on the same bins
+    gene_bins = {col: histogram_bins(filter_engine.numbers[col]) for col in HISTOGRAM_COLUMNS if col in filter_engine.numbers}
 
-    df['Protein-coding_genes'] = pd.to_numeric(df['Protein-coding_genes'], errors='coerce')
-
-    df['Pseudogenes'] = pd.to_numeric(df['Pseudogenes'], errors='coerce')
-    
-    df['ANI_best_match_score'] = pd.to_numeric(df['ANI_best_match_score'], errors='coerce')
-
-    df['ANI_best_matched_assembly\'s_coverage'] = pd.to_numeric(df['ANI_best_matched_assembly\'s_coverage'], errors='coerce')
-
-    df['Contig_N50'] = pd.to_numeric(df['Contig_N50'], errors='coerce')
-
-    df['Contig_L50'] = pd.to_numeric(df['Contig_L50'], errors='coerce')
+    n50_max = slider_bounds['Contig_N50'][1]
+    l50_max = slider_bounds['Contig_L50'][1]
+    total_genes_max = slider_bounds['Total_genes'][1]
+    cds_max = slider_bounds['Protein-coding_genes'][1]
+    non_coding_max = slider_bounds['Non-coding_genes'][1]
+    pseudogene_max = slider_bounds['Pseudogenes'][1]
 
     flask_logger = logging.getLogger('werkzeug')
     flask_logger.setLevel(logging.ERROR)
@@ -80,6 +83,15 @@ def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
         delay_hide=800,
         delay_show=800,
         children=[
+            # key of the current filter state and of the rows it selects; the rows themselves stay on the server
+            dcc.Store(id='filtered-rows'),
+            dcc.Store(id='filter-state'),
+            dcc.Store(id='choropleth-country'),
+            # the axis ranges the scatter plots were last drawn for, None when drawn in full
+            dcc.Store(id='ani-scatter-range'),
+            dcc.Store(id='n50l50-scatter-range'),
+            dcc.Store(id='export-job'),
+            dcc.Interval(id='export-progress-interval', interval=1000, disabled=True),
             html.Div(
                 children=[
                     html.H1(
@@ -447,21 +459,21 @@ def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
                                     html.H6('Contig N50', style={'marginBottom': '10px', 'color': '#333'}),
                                     dcc.RangeSlider(
                                         id='n50-slider',
-                                        min=int(df['Contig_N50'].min()),
-                                        max=int(df['Contig_N50'].max()),
+                                        min=slider_bounds['Contig_N50'][0],
+                                        max=slider_bounds['Contig_N50'][1],
                                         step=1,
-                                        marks={i: str(i) for i in range(0, int(df['Contig_N50'].max()), 1000000)},
-                                        value=[0, int(df['Contig_N50'].max())],
+                                        marks={i: str(i) for i in range(0, slider_bounds['Contig_N50'][1], 1000000)},
+                                        value=[0, slider_bounds['Contig_N50'][1]],
                                     ),
                                     html.Br(),
                                     html.H6('Contig L50', style={'marginBottom': '10px', 'color': '#333'}),
                                     dcc.RangeSlider(
                                         id='l50-slider',
-                                        min=int(df['Contig_L50'].min()),
-                                        max=int(df['Contig_L50'].max()),
+                                        min=slider_bounds['Contig_L50'][0],
+                                        max=slider_bounds['Contig_L50'][1],
                                         step=1,
-                                        marks={i: str(i) for i in range(0, int(df['Contig_L50'].max()), 500)},
-                                        value=[0, int(df['Contig_L50'].max())],
+                                        marks={i: str(i) for i in range(0, slider_bounds['Contig_L50'][1], 500)},
+                                        value=[0, slider_bounds['Contig_L50'][1]],
                                     ),
                                     html.Div(
                                         id='n50l50-slider-output',
@@ -505,11 +517,11 @@ def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
                                 children=[
                                     dcc.RangeSlider(
                                         id = 'total-gene-slider',
-                                        min = int(df['Total_genes'].min()),
-                                        max = int(df['Total_genes'].max()),
+                                        min = slider_bounds['Total_genes'][0],
+                                        max = slider_bounds['Total_genes'][1],
                                         step=1,
-                                        marks={i: str(i) for i in range(0, int(df['Total_genes'].max()), 2000)},
-                                        value=[0, int(df['Total_genes'].max())],
+                                        marks={i: str(i) for i in range(0, slider_bounds['Total_genes'][1], 2000)},
+                                        value=[0, slider_bounds['Total_genes'][1]],
                                     ),
                                     html.Div(
                                         id='total-gene-output',
@@ -530,7 +542,7 @@ def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
                                     ),
                                     dcc.Graph(
                                         id='total-gene-hist',
-                                        figure=Total_genes_hist(df=df),
+                                        figure=Total_genes_hist(df=df, bins=gene_bins.get('Total_genes')),
                                     ),
                                 ]
                             ),
@@ -545,11 +557,11 @@ def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
                                 children=[
                                     dcc.RangeSlider(
                                         id='cds-slider',
-                                        min=int(df['Protein-coding_genes'].min()),
-                                        max=int(df['Protein-coding_genes'].max()),
+                                        min=slider_bounds['Protein-coding_genes'][0],
+                                        max=slider_bounds['Protein-coding_genes'][1],
                                         step=1,
-                                        marks={i: str(i) for i in range(0, int(df['Protein-coding_genes'].max()), 2000)},
-                                        value=[0, int(df['Protein-coding_genes'].max())],
+                                        marks={i: str(i) for i in range(0, slider_bounds['Protein-coding_genes'][1], 2000)},
+                                        value=[0, slider_bounds['Protein-coding_genes'][1]],
                                     ),
                                     html.Div(
                                         id='cds-output',
@@ -570,7 +582,7 @@ def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
                                     ),
                                     dcc.Graph(
                                         id='cds-hist',
-                                        figure=CDSs_hist(df=df),
+                                        figure=CDSs_hist(df=df, bins=gene_bins.get('Protein-coding_genes')),
                                     ),
                                 ]
                             ),
@@ -585,11 +597,11 @@ def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
                                 children=[
                                     dcc.RangeSlider(
                                         id='non-coding-slider',
-                                        min=int(df['Non-coding_genes'].min()),
-                                        max=int(df['Non-coding_genes'].max()),
+                                        min=slider_bounds['Non-coding_genes'][0],
+                                        max=slider_bounds['Non-coding_genes'][1],
                                         step=1,
-                                        marks={i: str(i) for i in range(0, int(df['Non-coding_genes'].max()), 50)},
-                                        value=[0, int(df['Non-coding_genes'].max())],
+                                        marks={i: str(i) for i in range(0, slider_bounds['Non-coding_genes'][1], 50)},
+                                        value=[0, slider_bounds['Non-coding_genes'][1]],
                                     ),
                                     html.Div(
                                         id='non-coding-output',
@@ -610,7 +622,7 @@ def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
                                     ),
                                     dcc.Graph(
                                         id='non-coding-hist',
-                                        figure=Non_coding_hist(df=df),
+                                        figure=Non_coding_hist(df=df, bins=gene_bins.get('Non-coding_genes')),
                                     ),
                                 ]
                             ),
@@ -625,11 +637,11 @@ def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
                                 children=[
                                     dcc.RangeSlider(
                                         id='pseudogene-slider',
-                                        min=int(df['Pseudogenes'].min()),
-                                        max=int(df['Pseudogenes'].max()),
+                                        min=slider_bounds['Pseudogenes'][0],
+                                        max=slider_bounds['Pseudogenes'][1],
                                         step=1,
-                                        marks={i: str(i) for i in range(0, int(df['Pseudogenes'].max()), 500)},
-                                        value=[0, int(df['Pseudogenes'].max())],
+                                        marks={i: str(i) for i in range(0, slider_bounds['Pseudogenes'][1], 500)},
+                                        value=[0, slider_bounds['Pseudogenes'][1]],
                                     ),
                                     html.Div(
                                         id='pseudogene-output',
@@ -650,7 +662,7 @@ def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
                                     ),
                                     dcc.Graph(
                                         id='pseudogene-hist',
-                                        figure=Pseudogenes_hist(df=df),
+                                        figure=Pseudogenes_hist(df=df, bins=gene_bins.get('Pseudogenes')),
                                     ),
                                 ]
                             ),
@@ -679,7 +691,7 @@ def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
                                     dcc.Input(
                                         id='bioproject-input',
                                         type='text',
-                                        placeholder='Search Keywords separated by commas...',
+                                        placeholder='Search Keywords separated by commas (" & " to combine words, ~ after a word for similar spellings)...',
                                         debounce=True,
                                         style={
                                             'width': '700px',
@@ -728,7 +740,7 @@ def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
                                     dcc.Input(
                                         id='biosample-input',
                                         type='text',
-                                        placeholder='Search Keywords separated by commas...',
+                                        placeholder='Search Keywords separated by commas (" & " to combine words, ~ after a word for similar spellings)...',
                                         debounce=True,
                                         style={
                                             'width': '700px',
@@ -905,6 +917,19 @@ def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
                                     'height': '100px'  
                                 }
                             ),
+                            dcc.RadioItems(
+                                id='export-format-radio',
+                                options=[{'label': fmt, 'value': fmt} for fmt in available_formats()],
+                                value='tsv',
+                                inline=True,
+                                labelStyle={'margin': '0 10px'},
+                                style={'textAlign': 'center'},
+                            ),
+                            dbc.Progress(
+                                id='export-progress',
+                                value=0,
+                                style={'width': '50%', 'margin': '10px auto', 'visibility': 'hidden'},
+                            ),
                             html.Div(
                                 id='save-button-output',
                                 style={'textAlign': 'center', 'fontSize': '0.9em', 'color': '#555', 'marginTop': '10px'}
@@ -915,327 +940,226 @@ def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
             ),
         ],
     )
-    # Define callback
-    @meta_mined.callback(
-        [Output('choropleth-map', 'figure'),
-        Output('assembly-level-graph', 'figure'),
-        Output('annotation-graph', 'figure'),
-        Output('submission-year-slider-output', 'children'),
-        Output('atypical-radio-output', 'children'),
-        Output('suppressed-radio-output', 'children'),
-        Output('genome-count', 'value'),
-        Output('sequencing-technologies-line', 'figure'),
-        Output('submission-year-scatter', 'figure'),
-        Output('coverage-depth-bar', 'figure'),
-        Output('coverage-slider-output1', 'children'),
-        Output('coverage-slider-output2', 'children'),
-        Output('ani-scatter', 'figure'),
-        Output('ani-identity-null-output', 'children'),
-        Output('ani-sliders-outputs', 'children'),
-        Output('ani-coverage-null-output', 'children'),
-        Output('n50l50-slider-output', 'children'),
-        Output('n50l50-scatter', 'figure'), 
-        [Output('total-gene-output', 'children'),
-         Output('total-gene-hist', 'figure')],
-        Output('total-gene-null-output', 'children'),
-        [Output('cds-output', 'children'),
-         Output('cds-hist', 'figure')],
-        Output('cds-null-output', 'children'),
-        [Output('non-coding-output', 'children'),
-         Output('non-coding-hist', 'figure')],
-        Output('non-coding-null-output', 'children'),
-        [Output('pseudogene-output', 'children'),
-         Output('pseudogene-hist', 'figure')],
-        Output('pseudogene-null-output', 'children'),
-        [Output('bioproject-dropdown', 'options'),
-        Output('bioproject-dropdown', 'value')],
-        Output('bioproject-output', 'children'),
-        [Output('biosample-dropdown', 'options'),
-        Output('biosample-dropdown', 'value')],
-        Output('biosample-output', 'children'),
-        Output('source-category-dropdown', 'options'),
-        Output('source-dropdown', 'options'),
-        Output('sample-dropdown', 'options'),
-        [Output('treemap-output', 'children'),
-        Output('isolation-source-treemap', 'figure')],
-        Output('save-button-output', 'children'),],
-        [Input('country-dropdown', 'value'),
-        Input('assembly-level-checklist', 'value'),
-        Input('annotation-checklist', 'value'),
-        Input('submission-year-slider', 'value'),
-        Input('atypical-radio', 'value'),
-        Input('suppressed-radio', 'value'),
-        Input('genome-count', 'id'),
-        Input('sequencing-technology-dropdown', 'value'),
-        Input('submission-year-scatter', 'id'),
-        Input('coverage-slider', 'value'),
-        Input('coverage-checklist', 'value'),
-        Input('coverage-include-null-checklist', 'value'),
-        Input('ani-identity-slider', 'value'),
-        Input('ani-identity-include-null-checklist', 'value'),
-        Input('ani-coverage-slider', 'value'),
-        Input('ani-coverage-include-null-checklist', 'value'),
-        Input('n50-slider', 'value'),
-        Input('l50-slider', 'value'),
-        Input('total-gene-slider', 'value'),
-        Input('total-gene-include-null-checklist', 'value'),
-        Input('cds-slider', 'value'),
-        Input('cds-include-null-checklist', 'value'),
-        Input('non-coding-slider', 'value'),
-        Input('non-coding-include-null-checklist', 'value'),
-        Input('pseudogene-slider', 'value'),
-        Input('pseudogene-include-null-checklist', 'value'),
-        Input('bioproject-input', 'value'),
-        Input('bioproject-dropdown', 'value'),
-        Input('biosample-input', 'value'),
-        Input('biosample-dropdown', 'value'),
-        Input('identified-host-dropdown', 'value'),
-        Input('source-category-dropdown', 'value'),
-        Input('source-dropdown', 'value'),
-        Input('sample-dropdown', 'value'),
-        Input('save-button', 'n_clicks')]
-    )
 
-    # print("we are at update_dash")
-    def update_dash(selected_country, selected_assembly_level, show_annotations_from, year_range, atypical_radio, suppressed_radio, genome_count_id, selected_sequencing_technologies, submission_year_line_id, coverage_range, coverage_checklist, coverage_include_null_checklist, ani_identity_range, ani_identity_include_null_checklist, ani_coverage_range, ani_coverage_include_null_checklist, n50_range, l50_range,total_genes_range, total_genes_include_null_checklist, cds_range, cds_include_null_checklist, non_coding_range, non_coding_include_null_checklist, pseudogene_range, pseudogene_include_null_checklist, bioproject_input, bioproject_dropdown_values, biosample_input, biosample_dropdown_values, identified_host, source_category, source, sample, n_save_button_clicks):
-        modified_df = df.copy()
+    if timings_panel:
+        meta_mined.layout.children.append(
+            html.Details(
+                children=[
+                    html.Summary('Pipeline timings'),
+                    dcc.Interval(id='timings-interval', interval=5000),
+                    html.Pre(id='timings-panel', style={'fontSize': '0.8em', 'color': '#555'}),
+                ],
+                style={'margin': '20px'},
+            )
+        )
+
+    # Callbacks: one filter stage computes the selected rows per distinct filter state (memoized in `selection_cache`),
+    # and every figure has its own callback that only runs when its own inputs or the selected rows change.
+    selection_cache = SelectionCache(max_entries=32, max_bytes=256 << 20)
 
-        logging.debug(f"Shape of the modified_df before filtering: {modified_df.shape}")
+    # time per filter stage and per callback with its response size, served as JSON at `TIMINGS_ENDPOINT`
+    timings = PipelineTimings()
+    timings.instrument(meta_mined.server, extra={'selection_cache': selection_cache.stats})
 
-        for col in modified_df.columns:
-            if modified_df[col].apply(lambda x: isinstance(x, dict)).any():
-                logging.debug(f"Converting {col} data to string values as dictionaries may cause problem in filtering/removing duplicates.")
-                modified_df[col] = modified_df[col].apply(str)
+    # the bioproject/biosample selection depends on which of these widgets triggered the update
+    search_trigger_ids = ['bioproject-input', 'bioproject-dropdown', 'biosample-input', 'biosample-dropdown']
 
+    def filter_metadata(selected_country, selected_assembly_level, show_annotations_from, year_range, atypical_radio, suppressed_radio, selected_sequencing_technologies, coverage_range, coverage_checklist, coverage_include_null_checklist, ani_identity_range, ani_identity_include_null_checklist, ani_coverage_range, ani_coverage_include_null_checklist, n50_range, l50_range,total_genes_range, total_genes_include_null_checklist, cds_range, cds_include_null_checklist, non_coding_range, non_coding_include_null_checklist, pseudogene_range, pseudogene_include_null_checklist, bioproject_input, bioproject_dropdown_values, biosample_input, biosample_dropdown_values, identified_host, source_category, source, sample, triggered_id):
+        selection = filter_engine.select()
+        stopwatch = timings.stopwatch('filter')
+
+        logging.debug(f"Shape of the modified_df before filtering: {selection.shape}")
 
         if selected_country == 'World':
-            modified_df = modified_df
-            logging.debug(f"Seleted country is World. Shape of the modified_df after filtering by country: {modified_df.shape}")
+            logging.debug(f"Seleted country is World. Shape of the modified_df after filtering by country: {selection.shape}")
         else:
-            modified_df = modified_df[modified_df['country_common_name'] == selected_country]
-            logging.debug(f"Selected country is {selected_country}. Shape of the modified_df after filtering by country: {modified_df.shape}")
+            selection.filter(filter_engine.equals('country_common_name', selected_country))
+            logging.debug(f"Selected country is {selected_country}. Shape of the modified_df after filtering by country: {selection.shape}")
+        stopwatch.lap('country')
 
-        modified_df = modified_df[modified_df['Assembly_level'].isin(selected_assembly_level)]
+        selection.filter(filter_engine.isin('Assembly_level', selected_assembly_level))
         logging.debug(f"Selected assembly levels: {selected_assembly_level}")
-        logging.debug(f"Shape of the modified_df after filtering by assembly level: {modified_df.shape}")
+        logging.debug(f"Shape of the modified_df after filtering by assembly level: {selection.shape}")
+        stopwatch.lap('assembly_level')
 
-        modified_df = modified_df[modified_df['Annotation_category'].isin(show_annotations_from)]
+        selection.filter(filter_engine.isin('Annotation_category', show_annotations_from))
         logging.debug(f"Selected annotation categories: {show_annotations_from}")
-        logging.debug(f"Shape of the modified_df after filtering by annotation category: {modified_df.shape}")
+        logging.debug(f"Shape of the modified_df after filtering by annotation category: {selection.shape}")
+        stopwatch.lap('annotation')
 
         
-        modified_df = modified_df[(modified_df['Submission_year'] >= year_range[0]) & (modified_df['Submission_year'] <= year_range[1])]
+        selection.filter(filter_engine.between('Submission_year', year_range[0], year_range[1]))
 
 
         if atypical_radio == 'no_atypical':
-            earlier_length = modified_df.shape[0]
-            modified_df = modified_df[modified_df['Assmbly_atypical?'] == 'No']
-            atypical_output = f"Number of atypical assemblies excluded: {earlier_length - modified_df.shape[0]}"
+            earlier_length = selection.count()
+            selection.filter(filter_engine.equals('Assmbly_atypical?', 'No'))
+            atypical_output = f"Number of atypical assemblies excluded: {earlier_length - selection.count()}"
 
         elif atypical_radio == 'only_atypical':
-            earlier_length = modified_df.shape[0]
-            modified_df = modified_df[modified_df['Assmbly_atypical?'] == 'Yes']
-            atypical_output = f"Number of atypical assemblies: {modified_df.shape[0]}"
+            selection.filter(filter_engine.equals('Assmbly_atypical?', 'Yes'))
+            atypical_output = f"Number of atypical assemblies: {selection.count()}"
         else:
-            modified_df = modified_df
             atypical_output = None
 
         if suppressed_radio == 'no_suppressed':
-            all_length = modified_df.shape[0]
-            modified_df = modified_df[modified_df['Assembly_status'] == 'current']
-            suppressed_output = f"Number of suppressed assemblies excluded: {all_length - modified_df.shape[0]}"
+            all_length = selection.count()
+            selection.filter(filter_engine.equals('Assembly_status', 'current'))
+            suppressed_output = f"Number of suppressed assemblies excluded: {all_length - selection.count()}"
         elif suppressed_radio == 'only_suppressed':
-            all_length = modified_df.shape[0]
-            modified_df = modified_df[modified_df['Assembly_status'] == 'suppressed']
-            suppressed_output = f"Number of suppressed assemblies: {modified_df.shape[0]}"
+            selection.filter(filter_engine.equals('Assembly_status', 'suppressed'))
+            suppressed_output = f"Number of suppressed assemblies: {selection.count()}"
         else:
-            modified_df = modified_df
             suppressed_output = None
+        stopwatch.lap('year_atypical_suppressed')
+
+        if 'All' not in selected_sequencing_technologies:
+            selection.filter(filter_engine.isin('Categorized_sequencing_technologies', selected_sequencing_technologies))
+        logging.debug(f"Selected sequencing technology: {selected_sequencing_technologies}")
+        logging.debug(f"Shape of the modified_df after filtering by sequencing technology: {selection.shape}")
+        stopwatch.lap('sequencing_technology')
+
+        # the `union` calls keep the rows and their order identical to the earlier `pd.concat` of the sub-selections
+        coverage_null = filter_engine.isnull('Coverage_Depth')
+        coverage_above_5000 = filter_engine.greater('Coverage_Depth', 5000)
+        coverage_in_range = filter_engine.between('Coverage_Depth', coverage_range[0], coverage_range[1])
 
-        if 'All' in selected_sequencing_technologies:
-            modified_df = modified_df
-            logging.debug(f"Selected sequencing technology: {selected_sequencing_technologies}")
-            logging.debug(f"Shape of the modified_df after filtering by sequencing technology: {modified_df.shape}")
-        else:
-            modified_df = modified_df[modified_df['Categorized_sequencing_technologies'].isin(selected_sequencing_technologies)]
-            logging.debug(f"Selected sequencing technology: {selected_sequencing_technologies}")
-            logging.debug(f"Shape of the modified_df after filtering by sequencing technology: {modified_df.shape}")
-        
-        logging.debug(f"Shape of the modified_df after sorting sequencing technologies: {modified_df.shape}")
         coverage_null_text=""
         if coverage_range[0] == 0 & coverage_range[1] == 5000:            
             if '> 5000' in coverage_checklist and 'all' in coverage_include_null_checklist:
-                modified_df = modified_df  
+                pass
             elif '> 5000' in coverage_checklist and 'all' not in coverage_include_null_checklist:
                 coverage_null_text = f"Genomes with no coverage data are excluded."
-                coverage_df_above_5000 = modified_df[modified_df['Coverage_Depth'] > 5000]
-                coverage_df_below_5000 = modified_df[(modified_df['Coverage_Depth'] >= coverage_range[0]) & (modified_df['Coverage_Depth'] <= coverage_range[1])]
-                modified_df = pd.concat([coverage_df_above_5000, coverage_df_below_5000], ignore_index=True)
+                selection.union(coverage_above_5000, coverage_in_range)
             elif '> 5000' not in coverage_checklist and 'all' in coverage_include_null_checklist:
-                coverage_null_df = modified_df[pd.isnull(modified_df['Coverage_Depth'])]
-                coverage_df_below_5000 = modified_df[(modified_df['Coverage_Depth'] >= coverage_range[0]) & (modified_df['Coverage_Depth'] <= coverage_range[1])]
-                modified_df = pd.concat([coverage_null_df, coverage_df_below_5000], ignore_index=True)
+                selection.union(coverage_null, coverage_in_range)
             elif '> 5000' not in coverage_checklist and 'all' not in coverage_include_null_checklist:
                 coverage_null_text = f"Genomes with no coverage data are excluded."
-                modified_df = modified_df[(modified_df['Coverage_Depth'] >= coverage_range[0]) & (modified_df['Coverage_Depth'] <= coverage_range[1])]
+                selection.filter(coverage_in_range)
         else:
             if '> 5000' in coverage_checklist and 'all' in coverage_include_null_checklist:
-                coverage_null_df = modified_df[pd.isnull(modified_df['Coverage_Depth'])]
-                coverage_df_above_5000 = modified_df[modified_df['Coverage_Depth'] > 5000]
-                coverage_df_below_5000 = modified_df[(modified_df['Coverage_Depth'] >= coverage_range[0]) & (modified_df['Coverage_Depth'] <= coverage_range[1])]
-                modified_df = pd.concat([coverage_null_df, coverage_df_above_5000, coverage_df_below_5000], ignore_index=True)
+                selection.union(coverage_null, coverage_above_5000, coverage_in_range)
             elif '> 5000' in coverage_checklist and 'all' not in coverage_include_null_checklist:
                 coverage_null_text = f"Genomes with no coverage data are excluded."
-                coverage_df_above_5000 = modified_df[modified_df['Coverage_Depth'] > 5000]
-                coverage_df_below_5000 = modified_df[(modified_df['Coverage_Depth'] >= coverage_range[0]) & (modified_df['Coverage_Depth'] <= coverage_range[1])]
-                modified_df = pd.concat([coverage_df_above_5000, coverage_df_below_5000], ignore_index=True)
+                selection.union(coverage_above_5000, coverage_in_range)
             elif '> 5000' not in coverage_checklist and 'all' in coverage_include_null_checklist:
-                coverage_null_df = modified_df[pd.isnull(modified_df['Coverage_Depth'])]
-                coverage_df_below_5000 = modified_df[(modified_df['Coverage_Depth'] >= coverage_range[0]) & (modified_df['Coverage_Depth'] <= coverage_range[1])]
-                modified_df = pd.concat([coverage_null_df, coverage_df_below_5000], ignore_index=True)
+                selection.union(coverage_null, coverage_in_range)
             elif '> 5000' not in coverage_checklist and 'all' not in coverage_include_null_checklist:
                 coverage_null_text = f"Genomes with no coverage data are excluded."
-                modified_df = modified_df[(modified_df['Coverage_Depth'] >= coverage_range[0]) & (modified_df['Coverage_Depth'] <= coverage_range[1])]
-
-        for col in modified_df.columns:
-            if modified_df[col].apply(lambda x: isinstance(x, dict)).any():
-                logging.debug(f"Column '{col}' contains dictionaries.")
+                selection.filter(coverage_in_range)
 
-        logging.debug(f"Shape of the modified_df after coverage filters: {modified_df.shape}")
+        logging.debug(f"Shape of the modified_df after coverage filters: {selection.shape}")
+        stopwatch.lap('coverage')
+        ani_identity_null = filter_engine.isnull('ANI_best_match_score')
         ani_identity_null_text=""
         if ani_identity_range[0] == 0 & ani_identity_range[1] == 100:
-            if 'all' in ani_identity_include_null_checklist:
-                modified_df = modified_df
-            else:
-                ani_identity_null_text = f"{len(modified_df[pd.isnull(modified_df['ANI_best_match_score'])])} Genomes with no % ANI identity data are excluded."
-                modified_df = modified_df[pd.notnull(modified_df['ANI_best_match_score'])]
+            if 'all' not in ani_identity_include_null_checklist:
+                ani_identity_null_text = f"{selection.count(ani_identity_null)} Genomes with no % ANI identity data are excluded."
+                selection.filter(~ani_identity_null)
         else:
+            selected_ani_identity = filter_engine.between('ANI_best_match_score', ani_identity_range[0], ani_identity_range[1])
             if 'all' in ani_identity_include_null_checklist:
-                ANI_identity_null_df = modified_df[pd.isnull(modified_df['ANI_best_match_score'])]
-                selected_ANI_identity_df = modified_df[(modified_df['ANI_best_match_score'] >= ani_identity_range[0]) & (modified_df['ANI_best_match_score'] <= ani_identity_range[1])]
-                modified_df = pd.concat([selected_ANI_identity_df, ANI_identity_null_df], ignore_index=True)
-                modified_df.drop_duplicates()
+                selection.union(selected_ani_identity, ani_identity_null)
             else:
-                ani_identity_null_text = f"{len(modified_df[pd.isnull(modified_df['ANI_best_match_score'])])} Genomes with no % ANI identity data are excluded."
-                modified_df = modified_df[(modified_df['ANI_best_match_score'] >= ani_identity_range[0]) & (modified_df['ANI_best_match_score'] <= ani_identity_range[1])]
+                ani_identity_null_text = f"{selection.count(ani_identity_null)} Genomes with no % ANI identity data are excluded."
+                selection.filter(selected_ani_identity)
         
+        ani_coverage_null = filter_engine.isnull('ANI_best_matched_assembly\'s_coverage')
         ani_coverage_null_text = ""
         if ani_coverage_range[0] == 0 & ani_coverage_range[1] == 100:
-            if 'all' in ani_coverage_include_null_checklist:
-                modified_df = modified_df                
-            else:
-                ani_coverage_null_count = len(modified_df[pd.isnull(modified_df['ANI_best_matched_assembly\'s_coverage'])])
+            if 'all' not in ani_coverage_include_null_checklist:
+                ani_coverage_null_count = selection.count(ani_coverage_null)
                 ani_coverage_null_text = f"{ani_coverage_null_count} genomes with no % coverage data are excluded."
-                modified_df = modified_df[pd.notnull(modified_df['ANI_best_matched_assembly\'s_coverage'])]
+                selection.filter(~ani_coverage_null)
         else:
+            selected_ani_coverage = filter_engine.between('ANI_best_matched_assembly\'s_coverage', ani_coverage_range[0], ani_coverage_range[1])
             if 'all' in ani_coverage_include_null_checklist:
-                ANI_coverage_null_df = modified_df[pd.isnull(modified_df['ANI_best_matched_assembly\'s_coverage'])]
-                selected_ANI_coverage_df = modified_df[(modified_df['ANI_best_matched_assembly\'s_coverage'] >= ani_coverage_range[0]) & (modified_df['ANI_best_matched_assembly\'s_coverage'] <= ani_coverage_range[1])]
-                modified_df = pd.concat([selected_ANI_coverage_df, ANI_coverage_null_df], ignore_index=True)
-                modified_df.drop_duplicates()
+                selection.union(selected_ani_coverage, ani_coverage_null)
             else:
-                ani_coverage_null_count = len(modified_df[pd.isnull(modified_df['ANI_best_matched_assembly\'s_coverage'])])
+                ani_coverage_null_count = selection.count(ani_coverage_null)
                 ani_coverage_null_text = f"{ani_coverage_null_count} genomes with no % coverage data are excluded."
-                modified_df = modified_df[(modified_df['ANI_best_matched_assembly\'s_coverage'] >= ani_coverage_range[0]) & (modified_df['ANI_best_matched_assembly\'s_coverage'] <= ani_coverage_range[1])]
+                selection.filter(selected_ani_coverage)
 
-        if n50_range[0] == 0 & n50_range[1] == int(df['Contig_N50'].max()):
-            modified_df = modified_df
-        else:
-            modified_df = modified_df[(modified_df['Contig_N50'] >= n50_range[0]) & (modified_df['Contig_N50'] <= n50_range[1])]
+        if not (n50_range[0] == 0 & n50_range[1] == n50_max):
+            selection.filter(filter_engine.between('Contig_N50', n50_range[0], n50_range[1]))
         
-        if l50_range[0] == 0 & l50_range[1] == int(df['Contig_L50'].max()):
-            modified_df = modified_df
-        else:
-            modified_df = modified_df[(modified_df['Contig_L50'] >= l50_range[0]) & (modified_df['Contig_L50'] <= l50_range[1])]
+        if not (l50_range[0] == 0 & l50_range[1] == l50_max):
+            selection.filter(filter_engine.between('Contig_L50', l50_range[0], l50_range[1]))
 
-        logging.debug(f"Shape of the modified_df after ani filters: {modified_df.shape}")
+        logging.debug(f"Shape of the modified_df after ani filters: {selection.shape}")
+        stopwatch.lap('ani_n50_l50')
+        total_gene_null = filter_engine.isnull('Total_genes')
         total_gene_null_text = ""
-        if total_genes_range[0] == 0 & total_genes_range[1] == int(df['Total_genes'].max()):
-            if 'all' in total_genes_include_null_checklist:
-                modified_df = modified_df
-            else:
-                total_gene_null_text = f"{len(modified_df[pd.isnull(modified_df['Total_genes'])])} genomes excluded that didn't have total gene count."
-                modified_df = modified_df[pd.notnull(modified_df['Total_genes'])]
+        if total_genes_range[0] == 0 & total_genes_range[1] == total_genes_max:
+            if 'all' not in total_genes_include_null_checklist:
+                total_gene_null_text = f"{selection.count(total_gene_null)} genomes excluded that didn't have total gene count."
+                selection.filter(~total_gene_null)
         else:
+            selected_total_gene = filter_engine.between('Total_genes', total_genes_range[0], total_genes_range[1])
             if 'all' in total_genes_include_null_checklist:
-                total_gene_null_df = modified_df[pd.isnull(modified_df['Total_genes'])]
-                selected_total_gene_df = modified_df[(modified_df['Total_genes'] >= total_genes_range[0]) & (modified_df['Total_genes'] <= total_genes_range[1])]
-                modified_df = pd.concat([selected_total_gene_df, total_gene_null_df], ignore_index=True)
-                modified_df.drop_duplicates()
+                selection.union(selected_total_gene, total_gene_null)
             else:
-                total_gene_null_text = f"{len(modified_df[pd.isnull(modified_df['Total_genes'])])} genomes excluded that didn't have total gene count."
-                modified_df = modified_df[(modified_df['Total_genes'] >= total_genes_range[0]) & (modified_df['Total_genes'] <= total_genes_range[1])]
+                total_gene_null_text = f"{selection.count(total_gene_null)} genomes excluded that didn't have total gene count."
+                selection.filter(selected_total_gene)
 
+        cds_null = filter_engine.isnull('Protein-coding_genes')
         cds_null_text = ""
-        if cds_range[0] == 0 & cds_range[1] == int(df['Protein-coding_genes'].max()):
-            if 'all' in cds_include_null_checklist:
-                modified_df = modified_df
-            else:
-                cds_null_text = f"{len(modified_df[pd.isnull(modified_df['Protein-coding_genes'])])} genomes excluded that didn't have CDSs count."
-                modified_df = modified_df[pd.notnull(modified_df['Protein-coding_genes'])]
+        if cds_range[0] == 0 & cds_range[1] == cds_max:
+            if 'all' not in cds_include_null_checklist:
+                cds_null_text = f"{selection.count(cds_null)} genomes excluded that didn't have CDSs count."
+                selection.filter(~cds_null)
         else:
+            selected_cds = filter_engine.between('Protein-coding_genes', cds_range[0], cds_range[1])
             if 'all' in cds_include_null_checklist:
-                cds_null_df = modified_df[pd.isnull(modified_df['Protein-coding_genes'])]
-                selected_cds_df = modified_df[(modified_df['Protein-coding_genes'] >= cds_range[0]) & (modified_df['Protein-coding_genes'] <= cds_range[1])]
-                modified_df = pd.concat([selected_cds_df, cds_null_df], ignore_index=True)
-                modified_df.drop_duplicates()
+                selection.union(selected_cds, cds_null)
             else:
-                cds_null_text = f"{len(modified_df[pd.isnull(modified_df['Protein-coding_genes'])])} genomes excluded that didn't have CDSs count."
-                modified_df = modified_df[(modified_df['Protein-coding_genes'] >= cds_range[0]) & (modified_df['Protein-coding_genes'] <= cds_range[1])]
+                cds_null_text = f"{selection.count(cds_null)} genomes excluded that didn't have CDSs count."
+                selection.filter(selected_cds)
 
+        non_coding_null = filter_engine.isnull('Non-coding_genes')
         non_coding_null_text = ""
-        if non_coding_range[0] == 0 & non_coding_range[1] == int(df['Non-coding_genes'].max()):
-            if 'all' in non_coding_include_null_checklist:
-                modified_df = modified_df
-            else:
-                non_coding_null_text = f"{len(modified_df[pd.isnull(modified_df['Non-coding_genes'])])} genomes excluded that didn't have non-coding gene count."
-                modified_df = modified_df[pd.notnull(modified_df['Non-coding_genes'])]
+        if non_coding_range[0] == 0 & non_coding_range[1] == non_coding_max:
+            if 'all' not in non_coding_include_null_checklist:
+                non_coding_null_text = f"{selection.count(non_coding_null)} genomes excluded that didn't have non-coding gene count."
+                selection.filter(~non_coding_null)
         else:
+            selected_non_coding = filter_engine.between('Non-coding_genes', non_coding_range[0], non_coding_range[1])
             if 'all' in non_coding_include_null_checklist:
-                non_coding_null_df = modified_df[pd.isnull(modified_df['Non-coding_genes'])]
-                selected_non_coding_df = modified_df[(modified_df['Non-coding_genes'] >= non_coding_range[0]) & (modified_df['Non-coding_genes'] <= non_coding_range[1])]
-                modified_df = pd.concat([selected_non_coding_df, non_coding_null_df], ignore_index=True)
-                modified_df.drop_duplicates()
+                selection.union(selected_non_coding, non_coding_null)
             else:
-                non_coding_null_text = f"{len(modified_df[pd.isnull(modified_df['Non-coding_genes'])])} genomes excluded that didn't have non-coding gene count."
-                modified_df = modified_df[(modified_df['Non-coding_genes'] >= non_coding_range[0]) & (modified_df['Non-coding_genes'] <= non_coding_range[1])]
+                non_coding_null_text = f"{selection.count(non_coding_null)} genomes excluded that didn't have non-coding gene count."
+                selection.filter(selected_non_coding)
         
+        pseudogene_null = filter_engine.isnull('Pseudogenes')
         pseudogene_null_text = ""
-        if pseudogene_range[0] == 0 & pseudogene_range[1] == int(df['Pseudogenes'].max()):
-            if 'all' in pseudogene_include_null_checklist:
-                modified_df = modified_df
-            else:
-                pseudogene_null_text = f"{len(modified_df[pd.isnull(modified_df['Pseudogenes'])])} genomes excluded that didn't have pseudogene count"
-                modified_df = modified_df[pd.notnull(modified_df['Pseudogenes'])]
+        if pseudogene_range[0] == 0 & pseudogene_range[1] == pseudogene_max:
+            if 'all' not in pseudogene_include_null_checklist:
+                pseudogene_null_text = f"{selection.count(pseudogene_null)} genomes excluded that didn't have pseudogene count"
+                selection.filter(~pseudogene_null)
         else:
+            selected_pseudogene = filter_engine.between('Pseudogenes', pseudogene_range[0], pseudogene_range[1])
             if 'all' in pseudogene_include_null_checklist:
-                pseudogene_null_df = modified_df[pd.isnull(modified_df['Pseudogenes'])]
-                selected_pseudogene_df = modified_df[(modified_df['Pseudogenes'] >= pseudogene_range[0]) & (modified_df['Pseudogenes'] <= pseudogene_range[1])]
-                modified_df = pd.concat([selected_pseudogene_df, pseudogene_null_df], ignore_index=True)
-                modified_df.drop_duplicates()
+                selection.union(selected_pseudogene, pseudogene_null)
             else:
-                pseudogene_null_text = f"{len(modified_df[pd.isnull(modified_df['Pseudogenes'])])} genomes excluded that didn't have pseudogene count"
-                modified_df = modified_df[(modified_df['Pseudogenes'] >= pseudogene_range[0]) & (modified_df['Pseudogenes'] <= pseudogene_range[1])]
+                pseudogene_null_text = f"{selection.count(pseudogene_null)} genomes excluded that didn't have pseudogene count"
+                selection.filter(selected_pseudogene)
         
-        logging.debug(f"Shape of the modified_df after gene count filters: {modified_df.shape}")
+        logging.debug(f"Shape of the modified_df after gene count filters: {selection.shape}")
+        stopwatch.lap('gene_counts')
 
         # filtering the dataframe based on keywords in bioproject and biosample names  
         
-        triggered_id = ctx.triggered[0]['prop_id'].split('.')[0] if ctx.triggered else None
-
         logging.debug(f"Triggered ID: {triggered_id}")
         
-        bioproject_options = [{'label': i, 'value': i} for i in modified_df['Bioproject_title'].unique()]
+        # the options are kept as category codes and only turned into dropdown options when they are sent
+        bioproject_codes = selection.unique_codes('Bioproject_title')
 
         if bioproject_input:
 
-            bioproject_list = modified_df['Bioproject_title'].tolist()
-
-            keywords = [word.strip().lower() for word in bioproject_input.split(',') if word.strip()]
-            
             logging.debug(f"Input for bioproject: {bioproject_input}")
 
-            list_based_on_bioproject_input = [title for title in bioproject_list if any(kw in title.lower() for kw in keywords)]
+            # the distinct titles are searched through the index, then limited to the ones still in the selection
+            list_based_on_bioproject_input = list(selection.unique('Bioproject_title', matches=title_indexes['Bioproject_title'].search(bioproject_input)))
 
         else:
             bioproject_dropdown = []
@@ -1251,27 +1175,24 @@ def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
         else:
             if bioproject_dropdown_values:
                 # bioproject_dropdown = list(set(bioproject_dropdown_values)) or []
-                bioproject_dropdown = [title for title in modified_df['Bioproject_title'].unique() if title in bioproject_dropdown_values]
+                bioproject_dropdown = [title for title in filter_engine.labels('Bioproject_title', bioproject_codes) if title in bioproject_dropdown_values]
                 logging.debug("Fallback: using whatever is available in dropdown")
 
         if bioproject_dropdown != []:
-            modified_df = modified_df[modified_df['Bioproject_title'].isin(bioproject_dropdown)]
-            logging.debug(f"Filtered {len(modified_df)} rows using: {triggered_id}")
+            selection.filter(filter_engine.isin('Bioproject_title', bioproject_dropdown))
+            logging.debug(f"Filtered {selection.count()} rows using: {triggered_id}")
         else:
-            modified_df = modified_df
             logging.debug("No filtering applied for bioproject")
+        stopwatch.lap('bioproject')
         
 
-        biosample_options = [{'label': i, 'value': i} for i in modified_df['Biosample_title'].unique()]
+        biosample_codes = selection.unique_codes('Biosample_title')
 
         if biosample_input:
-            biosample_list = modified_df['Biosample_title'].tolist()
 
-            keywords_2 = [word.strip().lower() for word in biosample_input.split(',') if word.strip()]
-            
             logging.debug(f"Input for biosample: {biosample_input}")
 
-            list_based_on_biosample_input = [title for title in biosample_list if any(kw in title.lower() for kw in keywords_2)]
+            list_based_on_biosample_input = list(selection.unique('Biosample_title', matches=title_indexes['Biosample_title'].search(biosample_input)))
         
         else:
             biosample_dropdown = []
@@ -1287,133 +1208,676 @@ def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
         else:
             if biosample_dropdown_values:
                 # biosample_dropdown = list(set(biosample_dropdown_values)) or []
-                biosample_dropdown = [title for title in modified_df['Biosample_title'].unique() if title in biosample_dropdown_values]
+                biosample_dropdown = [title for title in filter_engine.labels('Biosample_title', biosample_codes) if title in biosample_dropdown_values]
                 logging.debug("Fallback: using whatever is available in dropdown")
         
         if biosample_dropdown != []:
-            modified_df = modified_df[modified_df['Biosample_title'].isin(biosample_dropdown)]
-            logging.debug(f"Filtered {len(modified_df)} rows using: {triggered_id}")
+            selection.filter(filter_engine.isin('Biosample_title', biosample_dropdown))
+            logging.debug(f"Filtered {selection.count()} rows using: {triggered_id}")
 
         else:
-            modified_df = modified_df
             logging.debug("No filtering applied for biosample")
+        stopwatch.lap('biosample')
 
-        modified_df = modified_df[modified_df['identified_host'].isin(identified_host)]
+        selection.filter(filter_engine.isin('identified_host', identified_host))
         logging.debug(f"Selected hosts: {identified_host}")
-        logging.debug(f"Shape of the modified_df after filtering by host: {modified_df.shape}")
+        logging.debug(f"Shape of the modified_df after filtering by host: {selection.shape}")
 
-        source_category_options = [{'label': i, 'value': i} for i in modified_df['source_category'].unique()]
+        source_category_codes = selection.unique_codes('source_category')
 
         if source_category:
-            modified_df = modified_df[modified_df['source_category'].isin(source_category)]
+            selection.filter(filter_engine.isin('source_category', source_category))
             logging.debug(f"Selected source categories: {source_category}")
-            logging.debug(f"Shape of the modified_df after filtering by source category: {modified_df.shape}")
-            source_options = [{'label': i, 'value': i} for i in modified_df['source'].unique()]
+            logging.debug(f"Shape of the modified_df after filtering by source category: {selection.shape}")
+            source_codes = selection.unique_codes('source')
         else:
-            modified_df = modified_df
-            source_options = []
+            source_codes = None
         
         if source:
-            modified_df = modified_df[modified_df['source'].isin(source)]
+            selection.filter(filter_engine.isin('source', source))
             logging.debug(f"Selected sources: {source}")
-            logging.debug(f"Shape of the modified_df after filtering by source: {modified_df.shape}")
+            logging.debug(f"Shape of the modified_df after filtering by source: {selection.shape}")
 
-            sample_options = [{'label': i, 'value': i} for i in modified_df['sample'].unique()]
+            sample_codes = selection.unique_codes('sample')
         else:
-            modified_df = modified_df
-            sample_options = []
+            sample_codes = None
 
         if sample:
-            modified_df = modified_df[modified_df['sample'].isin(sample)]
+            selection.filter(filter_engine.isin('sample', sample))
             logging.debug(f"Selected samples: {sample}")
-            logging.debug(f"Shape of the modified_df after filtering by sample: {modified_df.shape}")
-        else:
-            modified_df = modified_df
+            logging.debug(f"Shape of the modified_df after filtering by sample: {selection.shape}")
+
+        stopwatch.lap('isolation_source')
 
-        genome_count = modified_df.shape[0]
+        genome_count = selection.count()
 
         logging.debug(f"The genome count is {genome_count}")
 
-        location_map = Choropleth_map(df=modified_df, selected_country=selected_country)
+        bioproject_output = f"{len(selection.unique_codes('Bioproject_title'))} BioProjects are selected. They contain a total of {genome_count}assemblies."
         
-        assembly_level_graph = Assembly_level_bar(df=modified_df, selected_assembly_levels=selected_assembly_level)
-        
-        annotation_graph = Annotation_bar(df=modified_df, show_annotations_from=show_annotations_from)
+        biosample_output = f"Selected BioSamples contain a total of {genome_count} assemblies."
+
+        rows = selection.rows().astype(np.int32)
+        stopwatch.lap('rows')
+        stopwatch.total()
+
+        return {
+            'rows': rows,
+            'rows_key': rows_key(rows),
+            'options': {'Bioproject_title': bioproject_codes, 'Biosample_title': biosample_codes, 'source_category': source_category_codes, 'source': source_codes, 'sample': sample_codes},
+            'outputs': [atypical_output, suppressed_output, genome_count, coverage_null_text, ani_identity_null_text, ani_coverage_null_text, total_gene_null_text, cds_null_text, non_coding_null_text, pseudogene_null_text, bioproject_dropdown, bioproject_output, biosample_dropdown, biosample_output],
+        }
+
+    def cached_filter(filter_state, count=True):
+        key = state_key(filter_state)
+        result = selection_cache.get(key, count=count)
+
+        if result is None:
+            result = filter_metadata(*filter_state['values'], triggered_id=filter_state['triggered_id'])
+            selection_cache.put(key, result)
+
+        if count:
+            logging.debug(f"Selection cache: {selection_cache.stats()}")
+        return result
+
+    def filtered_frame(filtered_rows, columns=None):
+        # `filtered_rows` carries the filter state, so the rows can be recomputed if they were evicted from the cache
+        return filter_engine.frame(state_rows(filtered_rows['filter_state']), columns=columns)
+
+    # the widgets of the filter state, in the order of `filter_metadata`'s parameters
+    filter_inputs = [
+        Input('country-dropdown', 'value'),
+        Input('assembly-level-checklist', 'value'),
+        Input('annotation-checklist', 'value'),
+        Input('submission-year-slider', 'value'),
+        Input('atypical-radio', 'value'),
+        Input('suppressed-radio', 'value'),
+        Input('sequencing-technology-dropdown', 'value'),
+        Input('coverage-slider', 'value'),
+        Input('coverage-checklist', 'value'),
+        Input('coverage-include-null-checklist', 'value'),
+        Input('ani-identity-slider', 'value'),
+        Input('ani-identity-include-null-checklist', 'value'),
+        Input('ani-coverage-slider', 'value'),
+        Input('ani-coverage-include-null-checklist', 'value'),
+        Input('n50-slider', 'value'),
+        Input('l50-slider', 'value'),
+        Input('total-gene-slider', 'value'),
+        Input('total-gene-include-null-checklist', 'value'),
+        Input('cds-slider', 'value'),
+        Input('cds-include-null-checklist', 'value'),
+        Input('non-coding-slider', 'value'),
+        Input('non-coding-include-null-checklist', 'value'),
+        Input('pseudogene-slider', 'value'),
+        Input('pseudogene-include-null-checklist', 'value'),
+        Input('bioproject-input', 'value'),
+        Input('bioproject-dropdown', 'value'),
+        Input('biosample-input', 'value'),
+        Input('biosample-dropdown', 'value'),
+        Input('identified-host-dropdown', 'value'),
+        Input('source-category-dropdown', 'value'),
+        Input('source-dropdown', 'value'),
+        Input('sample-dropdown', 'value'),
+    ]
+
+    # dropdowns whose options come from the filter result, in the order of the callback outputs
+    option_columns = ['Bioproject_title', 'Biosample_title', 'source_category', 'source', 'sample']
+
+    def dropdown_options(column, codes):
+        if codes is None:
+            return []
+        return [{'label': i, 'value': i} for i in filter_engine.labels(column, codes)]
+
+    # widget names of the filter state, so the manifest of an export can be read and diffed
+    filter_names = list(inspect.signature(filter_metadata).parameters)[:-1]
+
+    # filter widgets that only select categorical columns, and those columns in the order `filter_metadata` filters them;
+    # every other widget has to be at its default for the count cubes to answer
+    cube_filter_names = ['selected_country', 'selected_assembly_level', 'show_annotations_from', 'year_range', 'atypical_radio', 'suppressed_radio', 'selected_sequencing_technologies', 'identified_host', 'source_category', 'source', 'sample']
+    cube_filter_columns = ['country_common_name', 'Assembly_level', 'Annotation_category', 'Submission_year', 'Assmbly_atypical?', 'Assembly_status', 'Categorized_sequencing_technologies', 'identified_host', 'source_category', 'source', 'sample']
+    # defaults that select every genome
+    unfiltered_values = ['World', 'all', ['All'], None, []]
+    # title dropdowns by the id that triggers them
+    title_dropdowns = {'bioproject-dropdown': 'bioproject_dropdown_values', 'biosample-dropdown': 'biosample_dropdown_values'}
+
+    # the cubes count the rows of the page's initial filter state; that state is also the first one the page asks for
+    layout = layout_values(meta_mined.layout)
+    default_filters = dict(zip(filter_names, [layout.get((i.component_id, i.component_property)) for i in filter_inputs]))
+    default_result = cached_filter({'values': list(default_filters.values()), 'triggered_id': None}, count=False)
+
+    # a narrowed state shows the null-data texts of the initial state, which only holds if those are empty
+    if use_count_cubes and not any(default_result['outputs'][3:10]):
+        count_cubes = CountCubes(filter_engine, default_result['rows'], bins=gene_bins)
+        # the atypical and suppressed texts count the rows before the continuous filters, so over every row;
+        # both share the engine, so a lookup of one is a lookup of the other
+        stage_cubes = CountCubes(filter_engine, np.arange(filter_engine.n_rows, dtype=np.int32))
+    else:
+        count_cubes = stage_cubes = None
+
+    def narrows_default(name, value):
+        default = default_filters[name]
+        if value == default or (not value and not default):
+            return True
+        if name not in cube_filter_names:
+            return False
+        if default in unfiltered_values:
+            return True
+        if name == 'year_range':
+            return default[0] <= value[0] and value[1] <= default[1]
+        return isinstance(default, list) and isinstance(value, list) and set(value) <= set(default)
+
+    def categorical_lookups(filters):
+        # the categorical filters of `filter_metadata`, in its order
+        lookups = {}
+        if filters['selected_country'] != 'World':
+            lookups['country_common_name'] = count_cubes.equals('country_common_name', filters['selected_country'])
+        lookups['Assembly_level'] = count_cubes.isin('Assembly_level', filters['selected_assembly_level'])
+        lookups['Annotation_category'] = count_cubes.isin('Annotation_category', filters['show_annotations_from'])
+        lookups['Submission_year'] = count_cubes.between('Submission_year', filters['year_range'][0], filters['year_range'][1])
+        if filters['atypical_radio'] == 'no_atypical':
+            lookups['Assmbly_atypical?'] = count_cubes.equals('Assmbly_atypical?', 'No')
+        elif filters['atypical_radio'] == 'only_atypical':
+            lookups['Assmbly_atypical?'] = count_cubes.equals('Assmbly_atypical?', 'Yes')
+        if filters['suppressed_radio'] == 'no_suppressed':
+            lookups['Assembly_status'] = count_cubes.equals('Assembly_status', 'current')
+        elif filters['suppressed_radio'] == 'only_suppressed':
+            lookups['Assembly_status'] = count_cubes.equals('Assembly_status', 'suppressed')
+        if 'All' not in filters['selected_sequencing_technologies']:
+            lookups['Categorized_sequencing_technologies'] = count_cubes.isin('Categorized_sequencing_technologies', filters['selected_sequencing_technologies'])
+        lookups['identified_host'] = count_cubes.isin('identified_host', filters['identified_host'])
+        for name in ['source_category', 'source', 'sample']:
+            if filters[name]:
+                lookups[name] = count_cubes.isin(name, filters[name])
+        return lookups
+
+    def stage_filters(lookups):
+        # the filters `filter_metadata` has applied once it has filtered the assembly status, for `stage_cubes`
+        last = cube_filter_columns.index('Assembly_status')
+        return {col: lookup for col, lookup in lookups.items() if cube_filter_columns.index(col) <= last and stage_cubes.narrows(col, lookup)}
+
+    def cube_filters(filter_state):
+        """Flags per value of the categorical columns `filter_state` narrows, or None if the state needs the row filter."""
+        if count_cubes is None:
+            return None
+        filters = dict(zip(filter_names, filter_state['values']))
+        if not all(narrows_default(name, value) for name, value in filters.items()):
+            return None
+        # a title dropdown that triggered the update without any value is left to `filter_metadata`
+        if filter_state['triggered_id'] in title_dropdowns and filters[title_dropdowns[filter_state['triggered_id']]] is None:
+            return None
+
+        lookups = categorical_lookups(filters)
+        # filters that keep every base row are left out, so the cubes are only split by the columns the state narrows
+        narrowed = {col: lookup for col, lookup in lookups.items() if count_cubes.narrows(col, lookup)}
+        if not all(count_cubes.filterable(col) for col in [*narrowed, *stage_filters(lookups)]):
+            return None
+        return narrowed
+
+    def cube_filter(filter_state, filters):
+        """The outputs of `filter_metadata` for a state the count cubes answer, counted from the cubes instead of the rows."""
+        stopwatch = timings.stopwatch('filter.cube')
+        values = dict(zip(filter_names, filter_state['values']))
+
+        def up_to(column, lookups=filters):
+            # the filters `filter_metadata` has applied once it has filtered `column`
+            return {col: lookup for col, lookup in lookups.items() if cube_filter_columns.index(col) <= cube_filter_columns.index(column)}
+
+        # counted like `filter_metadata` does, before the continuous filters that the base rows of `count_cubes` went through
+        stages = stage_filters(categorical_lookups(values))
+        if values['atypical_radio'] == 'no_atypical':
+            atypical_output = f"Number of atypical assemblies excluded: {stage_cubes.count(up_to('Submission_year', stages)) - stage_cubes.count(up_to('Assmbly_atypical?', stages))}"
+        elif values['atypical_radio'] == 'only_atypical':
+            atypical_output = f"Number of atypical assemblies: {stage_cubes.count(up_to('Assmbly_atypical?', stages))}"
+        else:
+            atypical_output = None
 
-        submission_year_text = f"Assembly Submission Year Range: {year_range[0]} - {year_range[1]}"
+        if values['suppressed_radio'] == 'no_suppressed':
+            suppressed_output = f"Number of suppressed assemblies excluded: {stage_cubes.count(up_to('Assmbly_atypical?', stages)) - stage_cubes.count(up_to('Assembly_status', stages))}"
+        elif values['suppressed_radio'] == 'only_suppressed':
+            suppressed_output = f"Number of suppressed assemblies: {stage_cubes.count(up_to('Assembly_status', stages))}"
+        else:
+            suppressed_output = None
+
+        # the cascading options, each from the filters applied before its dropdown
+        bioproject_codes = count_cubes.unique_codes('Bioproject_title', up_to('Categorized_sequencing_technologies'))
+        biosample_codes = count_cubes.unique_codes('Biosample_title', up_to('Categorized_sequencing_technologies'))
+        source_category_codes = count_cubes.unique_codes('source_category', up_to('identified_host'))
+        source_codes = count_cubes.unique_codes('source', up_to('source_category')) if values['source_category'] else None
+        sample_codes = count_cubes.unique_codes('sample', up_to('source')) if values['source'] else None
+
+        genome_count = count_cubes.count(filters)
+        bioproject_output = f"{len(count_cubes.unique_codes('Bioproject_title', filters))} BioProjects are selected. They contain a total of {genome_count}assemblies."
+        biosample_output = f"Selected BioSamples contain a total of {genome_count} assemblies."
+        stopwatch.total()
+
+        return {
+            # the narrowed filters identify the selected rows among the base rows
+            'rows_key': 'cube:' + state_key({col: np.flatnonzero(lookup).tolist() for col, lookup in filters.items()}),
+            'options': {'Bioproject_title': bioproject_codes, 'Biosample_title': biosample_codes, 'source_category': source_category_codes, 'source': source_codes, 'sample': sample_codes},
+            'outputs': [atypical_output, suppressed_output, genome_count, *default_result['outputs'][3:10], [], bioproject_output, [], biosample_output],
+        }
+
+    def filter_result(filter_state):
+        # a state the count cubes answer skips the row filter; its result has no rows
+        filters = cube_filters(filter_state)
+        if filters is None:
+            return cached_filter(filter_state)
+
+        key = 'cube:' + state_key(filter_state)
+        result = selection_cache.get(key)
+        if result is None:
+            result = cube_filter(filter_state, filters)
+            selection_cache.put(key, result)
+        return result
+
+    def state_rows(filter_state):
+        # the rows of a state the count cubes answer are looked up among their base rows, without the row filter
+        filters = cube_filters(filter_state)
+        if filters is None:
+            return cached_filter(filter_state, count=False)['rows']
+        return count_cubes.rows_of(filters)
+
+    # the rows of a filter state, for the benchmark and the tests
+    meta_mined.selected_rows = state_rows
+
+    def chart_data(filtered_rows, columns, counts):
+        # (None, `counts(filters)`) when the count cubes answer the state, else (the `columns` of the selected rows, None)
+        filters = cube_filters(filtered_rows['filter_state'])
+        if filters is None:
+            return filtered_frame(filtered_rows, columns), None
+        return None, counts(filters)
+
+    @meta_mined.callback(
+        [Output('filtered-rows', 'data'),
+        Output('filter-state', 'data'),
+        Output('atypical-radio-output', 'children'),
+        Output('suppressed-radio-output', 'children'),
+        Output('genome-count', 'value'),
+        Output('coverage-slider-output2', 'children'),
+        Output('ani-identity-null-output', 'children'),
+        Output('ani-coverage-null-output', 'children'),
+        Output('total-gene-null-output', 'children'),
+        Output('cds-null-output', 'children'),
+        Output('non-coding-null-output', 'children'),
+        Output('pseudogene-null-output', 'children'),
+        [Output('bioproject-dropdown', 'options'),
+        Output('bioproject-dropdown', 'value')],
+        Output('bioproject-output', 'children'),
+        [Output('biosample-dropdown', 'options'),
+        Output('biosample-dropdown', 'value')],
+        Output('biosample-output', 'children'),
+        Output('source-category-dropdown', 'options'),
+        Output('source-dropdown', 'options'),
+        Output('sample-dropdown', 'options'),
+        Output('submission-year-slider-output', 'children'),
+        Output('ani-sliders-outputs', 'children'),
+        Output('n50l50-slider-output', 'children'),
+        Output('total-gene-output', 'children'),
+        Output('cds-output', 'children'),
+        Output('non-coding-output', 'children'),
+        Output('pseudogene-output', 'children'),],
+        filter_inputs,
+        [State('filtered-rows', 'data'),
+        State('filter-state', 'data')],
+    )
+    def update_filters(selected_country, selected_assembly_level, show_annotations_from, year_range, atypical_radio, suppressed_radio, selected_sequencing_technologies, coverage_range, coverage_checklist, coverage_include_null_checklist, ani_identity_range, ani_identity_include_null_checklist, ani_coverage_range, ani_coverage_include_null_checklist, n50_range, l50_range,total_genes_range, total_genes_include_null_checklist, cds_range, cds_include_null_checklist, non_coding_range, non_coding_include_null_checklist, pseudogene_range, pseudogene_include_null_checklist, bioproject_input, bioproject_dropdown_values, biosample_input, biosample_dropdown_values, identified_host, source_category, source, sample, previous_filtered_rows, previous_filter_state):
+        filter_values = [selected_country, selected_assembly_level, show_annotations_from, year_range, atypical_radio, suppressed_radio, selected_sequencing_technologies, coverage_range, coverage_checklist, coverage_include_null_checklist, ani_identity_range, ani_identity_include_null_checklist, ani_coverage_range, ani_coverage_include_null_checklist, n50_range, l50_range,total_genes_range, total_genes_include_null_checklist, cds_range, cds_include_null_checklist, non_coding_range, non_coding_include_null_checklist, pseudogene_range, pseudogene_include_null_checklist, bioproject_input, bioproject_dropdown_values, biosample_input, biosample_dropdown_values, identified_host, source_category, source, sample]
 
-        sequencing_technologies_over_the_years = Sequencing_technologies_scatter(df=modified_df, selected_sequencing_technologies=selected_sequencing_technologies)
+        triggered_id = ctx.triggered[0]['prop_id'].split('.')[0] if ctx.triggered else None
+        if triggered_id not in search_trigger_ids:
+            triggered_id = None
 
-        submissions_over_the_years = Submission_year_line(df=modified_df)
+        filter_state = {'values': filter_values, 'triggered_id': triggered_id}
+        result = filter_result(filter_state)
 
-        coverage_depth_bar = Coverage_bar(df=modified_df)
+        # the figures only listen to this store, so they are left alone when the selected rows did not change
+        if previous_filtered_rows is not None and previous_filtered_rows['rows_key'] == result['rows_key']:
+            filtered_rows = no_update
+            logging.debug("Selected rows are unchanged; figures are not recomputed.")
+        else:
+            filtered_rows = {'filter_state': filter_state, 'rows_key': result['rows_key']}
+
+        # the current state is always stored (the export reads it); option lists are only sent when they changed
+        options_keys = {col: None if codes is None else rows_key(codes) for col, codes in result['options'].items()}
+        unchanged = [previous_filter_state is not None and options_keys[col] == previous_filter_state['options_keys'][col] for col in option_columns]
+        options = [no_update if unchanged[i] else dropdown_options(col, result['options'][col]) for i, col in enumerate(option_columns)]
+        current_filter_state = {'filter_state': filter_state, 'rows_key': result['rows_key'], 'options_keys': options_keys}
+
+        (atypical_output, suppressed_output, genome_count, coverage_null_text, ani_identity_null_text, ani_coverage_null_text, total_gene_null_text, cds_null_text, non_coding_null_text, pseudogene_null_text,
+         bioproject_dropdown, bioproject_output, biosample_dropdown, biosample_output) = result['outputs']
+
+        submission_year_text = f"Assembly Submission Year Range: {year_range[0]} - {year_range[1]}"
 
-        coverage_depth_text = f"Coverage Depth range: {modified_df['Coverage_Depth'].min()}X to {modified_df['Coverage_Depth'].max()}X"
-        
-        ani_score_scatter = ANI_scatter(df=modified_df)
-        
         ani_score_text = f"Selected % Identity: {ani_identity_range[0]}  to {ani_identity_range[1]}, Selected % Coverage: {ani_coverage_range[0]} to {ani_coverage_range[1]}" 
 
         n50l50_output_text= f"Contig N50: {n50_range[0]} - {n50_range[1]}, Contig L50: {l50_range[0]} - {l50_range[1]}"
 
-        n50l50_scatter = N50L50_scatter(df=modified_df)
-        
-        total_gene_dist = Total_genes_hist(df=modified_df)
         total_gene_text = f"Selected 'Total gene' range: {total_genes_range[0]} to {total_genes_range[1]}"
-
-        cds_dist = CDSs_hist(df=modified_df)
         cds_text = f"Selected 'CDSs' range: {cds_range[0]} to {cds_range[1]}"
-        
-        non_coding_dist = Non_coding_hist(df=modified_df)
         non_coding_text = f"Selected 'Non-coding gene' range: {non_coding_range[0]} to {non_coding_range[1]}"
-
-        pseudogene_dist = Pseudogenes_hist(df=modified_df)
         pseudogene_text = f"Selected 'Pseudogene' range: {pseudogene_range[0]} to {pseudogene_range[1]}"
 
-        bioproject_output = f"{len(modified_df['Bioproject_title'].unique())} BioProjects are selected. They contain a total of {len(modified_df)}assemblies."
-        
-        biosample_output = f"Selected BioSamples contain a total of {len(modified_df)} assemblies."
-        
-        treemap_df = modified_df.copy()
+        return [filtered_rows, current_filter_state, atypical_output, suppressed_output, genome_count, coverage_null_text, ani_identity_null_text, ani_coverage_null_text, total_gene_null_text, cds_null_text, non_coding_null_text, pseudogene_null_text,
+                [options[0], bioproject_dropdown], bioproject_output, [options[1], biosample_dropdown], biosample_output, options[2], options[3], options[4], submission_year_text, ani_score_text, n50l50_output_text, total_gene_text, cds_text, non_coding_text, pseudogene_text]
+
+    @meta_mined.callback(
+        [Output('choropleth-map', 'figure'),
+        Output('choropleth-country', 'data')],
+        [Input('filtered-rows', 'data'),
+        Input('country-dropdown', 'value')],
+        State('choropleth-country', 'data')
+    )
+    def update_choropleth_map(filtered_rows, selected_country, drawn_country):
+        if filtered_rows is None:
+            return no_update, no_update
+        modified_df, counts = chart_data(filtered_rows, CHOROPLETH_COLUMNS, lambda filters: count_cubes.counts_by(CHOROPLETH_COLUMNS, filters, dropna=False))
+
+        if drawn_country != selected_country:
+            return Choropleth_map(df=modified_df, selected_country=selected_country, counts=counts), selected_country
+
+        # same country on the page: only the counts are sent, the geometry stays on the client
+        update = Choropleth_update(df=modified_df, selected_country=selected_country, counts=counts)
+
+        fig = Patch()
+        fig['data'][0]['locations'] = update['locations']
+        fig['data'][0]['z'] = update['z']
+        fig['data'][0]['hovertext'] = update['hovertext']
+        fig['data'][0]['customdata'] = update['customdata']
+        fig['layout']['title']['text'] = update['title']
+        return fig, no_update
+
+    @meta_mined.callback(
+        Output('assembly-level-graph', 'figure'),
+        [Input('filtered-rows', 'data'),
+        Input('assembly-level-checklist', 'value')]
+    )
+    def update_assembly_level_graph(filtered_rows, selected_assembly_level):
+        if filtered_rows is None:
+            return no_update
+        modified_df, counts = chart_data(filtered_rows, ['Assembly_level'], lambda filters: count_cubes.counts_by(['Assembly_level'], filters))
+        return Assembly_level_bar(df=modified_df, selected_assembly_levels=selected_assembly_level, counts=counts)
+
+    @meta_mined.callback(
+        Output('annotation-graph', 'figure'),
+        [Input('filtered-rows', 'data'),
+        Input('annotation-checklist', 'value')]
+    )
+    def update_annotation_graph(filtered_rows, show_annotations_from):
+        if filtered_rows is None:
+            return no_update
+        modified_df, counts = chart_data(filtered_rows, ['Annotation_category'], lambda filters: count_cubes.counts_by(['Annotation_category'], filters))
+        return Annotation_bar(df=modified_df, show_annotations_from=show_annotations_from, counts=counts)
+
+    @meta_mined.callback(
+        Output('submission-year-scatter', 'figure'),
+        Input('filtered-rows', 'data')
+    )
+    def update_submission_year_line(filtered_rows):
+        if filtered_rows is None:
+            return no_update
+        modified_df, counts = chart_data(filtered_rows, ['Submission_year'], lambda filters: count_cubes.counts_by(['Submission_year'], filters))
+        return Submission_year_line(df=modified_df, counts=counts)
+
+    @meta_mined.callback(
+        Output('sequencing-technologies-line', 'figure'),
+        [Input('filtered-rows', 'data'),
+        Input('sequencing-technology-dropdown', 'value')]
+    )
+    def update_sequencing_technologies_scatter(filtered_rows, selected_sequencing_technologies):
+        if filtered_rows is None:
+            return no_update
+        columns = ['Submission_year', 'Categorized_sequencing_technologies']
+        modified_df, counts = chart_data(filtered_rows, columns, lambda filters: count_cubes.counts_by(columns, filters))
+        return Sequencing_technologies_scatter(df=modified_df, selected_sequencing_technologies=selected_sequencing_technologies, counts=counts)
+
+    @meta_mined.callback(
+        [Output('coverage-depth-bar', 'figure'),
+        Output('coverage-slider-output1', 'children')],
+        Input('filtered-rows', 'data')
+    )
+    def update_coverage_bar(filtered_rows):
+        if filtered_rows is None:
+            return no_update, no_update
+        modified_df, counts = chart_data(filtered_rows, ['Coverage_Depth'], lambda filters: (count_cubes.binned_counts('Coverage_Depth', filters), count_cubes.value_range('Coverage_Depth', filters)))
+
+        if counts is None:
+            coverage_depth_text = f"Coverage Depth range: {modified_df['Coverage_Depth'].min()}X to {modified_df['Coverage_Depth'].max()}X"
+            return Coverage_bar(df=modified_df), coverage_depth_text
+
+        (counts, null_length), (coverage_min, coverage_max) = counts
+        coverage_depth_text = f"Coverage Depth range: {coverage_min}X to {coverage_max}X"
+        return Coverage_bar(df=None, counts=counts, null_length=null_length), coverage_depth_text
+
+    def zoomed_scatter(scatter_function, graph_id, columns, filtered_rows, relayout_data, drawn_range):
+        # zooming only re-bins the visible range; below SCATTER_POINT_LIMIT the browser zooms the WebGL points itself
+        if filtered_rows is None:
+            return no_update, no_update
+
+        triggered_id = ctx.triggered[0]['prop_id'].split('.')[0] if ctx.triggered else None
+
+        # new rows are drawn in full; the zoom in `relayout_data` belongs to the figure they replace
+        if triggered_id != graph_id:
+            return scatter_function(df=filtered_frame(filtered_rows, columns)), None
+
+        zoom = relayout_ranges(relayout_data)
+        if zoom is None:
+            return no_update, no_update
+
+        x_range, y_range = zoom
+        if x_range is None and y_range is None:
+            # a reset of the axes only needs a new figure if the current one was drawn for a range
+            if drawn_range is None:
+                return no_update, no_update
+            return scatter_function(df=filtered_frame(filtered_rows, columns)), None
+
+        modified_df = filtered_frame(filtered_rows, columns)
+        if len(modified_df) <= SCATTER_POINT_LIMIT:
+            return no_update, no_update
+
+        return scatter_function(df=modified_df, x_range=x_range, y_range=y_range), [x_range, y_range]
+
+    @meta_mined.callback(
+        [Output('ani-scatter', 'figure'),
+        Output('ani-scatter-range', 'data')],
+        [Input('filtered-rows', 'data'),
+        Input('ani-scatter', 'relayoutData')],
+        State('ani-scatter-range', 'data')
+    )
+    def update_ani_scatter(filtered_rows, relayout_data, drawn_range):
+        return zoomed_scatter(ANI_scatter, 'ani-scatter', ['ANI_best_match_score', 'ANI_best_matched_assembly\'s_coverage', 'Categorized_sequencing_technologies'], filtered_rows, relayout_data, drawn_range)
+
+    @meta_mined.callback(
+        [Output('n50l50-scatter', 'figure'),
+        Output('n50l50-scatter-range', 'data')],
+        [Input('filtered-rows', 'data'),
+        Input('n50l50-scatter', 'relayoutData')],
+        State('n50l50-scatter-range', 'data')
+    )
+    def update_n50l50_scatter(filtered_rows, relayout_data, drawn_range):
+        return zoomed_scatter(N50L50_scatter, 'n50l50-scatter', ['Contig_N50', 'Contig_L50', 'Categorized_sequencing_technologies'], filtered_rows, relayout_data, drawn_range)
+
+    @meta_mined.callback(
+        Output('total-gene-hist', 'figure'),
+        Input('filtered-rows', 'data')
+    )
+    def update_total_gene_hist(filtered_rows):
+        if filtered_rows is None:
+            return no_update
+        modified_df, counts = chart_data(filtered_rows, ['Total_genes'], lambda filters: count_cubes.binned_counts('Total_genes', filters))
+        if counts is None:
+            return Total_genes_hist(df=modified_df, bins=gene_bins.get('Total_genes'))
+        return Total_genes_hist(df=None, counts=counts[0], null_length=counts[1], bins=gene_bins['Total_genes'])
+
+    @meta_mined.callback(
+        Output('cds-hist', 'figure'),
+        Input('filtered-rows', 'data')
+    )
+    def update_cds_hist(filtered_rows):
+        if filtered_rows is None:
+            return no_update
+        modified_df, counts = chart_data(filtered_rows, ['Protein-coding_genes'], lambda filters: count_cubes.binned_counts('Protein-coding_genes', filters))
+        if counts is None:
+            return CDSs_hist(df=modified_df, bins=gene_bins.get('Protein-coding_genes'))
+        return CDSs_hist(df=None, counts=counts[0], null_length=counts[1], bins=gene_bins['Protein-coding_genes'])
 
-        treemap_df = treemap_df[treemap_df['identified_host'] != 'Unknown']
+    @meta_mined.callback(
+        Output('non-coding-hist', 'figure'),
+        Input('filtered-rows', 'data')
+    )
+    def update_non_coding_hist(filtered_rows):
+        if filtered_rows is None:
+            return no_update
+        modified_df, counts = chart_data(filtered_rows, ['Non-coding_genes'], lambda filters: count_cubes.binned_counts('Non-coding_genes', filters))
+        if counts is None:
+            return Non_coding_hist(df=modified_df, bins=gene_bins.get('Non-coding_genes'))
+        return Non_coding_hist(df=None, counts=counts[0], null_length=counts[1], bins=gene_bins['Non-coding_genes'])
 
-        treemap_text = f"Isolation source is Unknown for {len(modified_df[modified_df['identified_host'] == 'Unknown'])} genomes among all selected genomes."
-        isolation_treemap = Isolation_source_treemap(df=treemap_df)
+    @meta_mined.callback(
+        Output('pseudogene-hist', 'figure'),
+        Input('filtered-rows', 'data')
+    )
+    def update_pseudogene_hist(filtered_rows):
+        if filtered_rows is None:
+            return no_update
+        modified_df, counts = chart_data(filtered_rows, ['Pseudogenes'], lambda filters: count_cubes.binned_counts('Pseudogenes', filters))
+        if counts is None:
+            return Pseudogenes_hist(df=modified_df, bins=gene_bins.get('Pseudogenes'))
+        return Pseudogenes_hist(df=None, counts=counts[0], null_length=counts[1], bins=gene_bins['Pseudogenes'])
 
-        if n_save_button_clicks > 0:
+    @meta_mined.callback(
+        [Output('treemap-output', 'children'),
+        Output('isolation-source-treemap', 'figure')],
+        Input('filtered-rows', 'data')
+    )
+    def update_isolation_source_treemap(filtered_rows):
+        if filtered_rows is None:
+            return no_update, no_update
+        columns = ['identified_host', 'source_category', 'source', 'sample']
+        modified_df, counts = chart_data(filtered_rows, columns, lambda filters: count_cubes.counts_by(columns, filters, dropna=False))
+
+        if counts is None:
+            treemap_df = modified_df[modified_df['identified_host'] != 'Unknown']
+            treemap_text = f"Isolation source is Unknown for {len(modified_df[modified_df['identified_host'] == 'Unknown'])} genomes among all selected genomes."
+            isolation_treemap = Isolation_source_treemap(df=treemap_df)
+        else:
+            unknown_host = (counts['identified_host'] == 'Unknown').to_numpy()
+            treemap_text = f"Isolation source is Unknown for {counts['count'][unknown_host].sum()} genomes among all selected genomes."
+            isolation_treemap = Isolation_source_treemap(df=None, counts=counts[~unknown_host])
+
+        return treemap_text, isolation_treemap
+
+    export_jobs = ExportJobs(status_dir=job_status_dir)
+
+
+    progress_hidden = {'width': '50%', 'margin': '10px auto', 'visibility': 'hidden'}
+    progress_shown = {'width': '50%', 'margin': '10px auto', 'visibility': 'visible'}
+
+    @meta_mined.callback(
+        [Output('save-button-output', 'children'),
+        Output('export-job', 'data'),
+        Output('export-progress-interval', 'disabled'),
+        Output('export-progress', 'value'),
+        Output('export-progress', 'label'),
+        Output('export-progress', 'style')],
+        [Input('save-button', 'n_clicks'),
+        Input('export-progress-interval', 'n_intervals')],
+        [State('filter-state', 'data'),
+        State('export-format-radio', 'value'),
+        State('export-job', 'data')]
+    )
+    def save_filtered_data(n_save_button_clicks, n_intervals, current_filter_state, export_format, export_job):
+        if ctx.triggered_id == 'save-button' and n_save_button_clicks > 0 and current_filter_state is not None:
             logging.debug("Button Pressed!")
 
             try:
-                date_time = datetime.now()
-                date_time = str(date_time).replace(" ", "_")
-                date_time = date_time.replace(":", "-")
-                # print(date_time)
-                saving_file_name = "filtered_data_" + date_time + ".tsv"
-                # print(saving_file_name)
-                
-                saving_file_as = str(os.path.join(saving_file_path, saving_file_name)) 
-                # print(saving_file_as)
-                modified_df.to_csv(saving_file_as, index=False, sep='\t')
-                logging.info(f"File saved successfully at {os.path.abspath(saving_file_as)}")
-                save_message = f"File saved successfully at {os.path.abspath(saving_file_as)}"
+                filter_state = current_filter_state['filter_state']
+                manifest = {
+                    'filter_state': filter_state,
+                    'filter_state_key': state_key(filter_state),
+                    'filters': dict(zip(filter_names, filter_state['values'])),
+                    'rows_key': current_filter_state['rows_key'],
+                    'columns': list(filter_engine.df.columns),
+                }
+                rows = state_rows(filter_state)
+                job_id = export_jobs.submit(filter_engine.frame, rows, saving_file_path, export_format, manifest)
             except Exception as e:
                 logging.info(f"Error saving file: {str(e)}")
-                save_message =  f"Error saving file: {str(e)}"
-            
-        else:
-            save_message = ""
+                return f"Error saving file: {str(e)}", no_update, True, 0, "", progress_hidden
+
+            return f"Saving {len(rows)} rows as {export_format}...", job_id, False, 0, "0%", progress_shown
+
+        if ctx.triggered_id == 'export-progress-interval' and export_job is not None:
+            job = export_jobs.status(export_job)
+            if job is None:
+                return "", None, True, 0, "", progress_hidden
+
+            percent = int(100 * job['rows_written'] / job['total_rows']) if job['total_rows'] else 100
 
+            if job['state'] == 'done':
+                return f"File saved successfully at {job['path']}", None, True, 100, "100%", progress_shown
+            if job['state'] == 'failed':
+                return f"Error saving file: {job['error']}", None, True, percent, f"{percent}%", progress_hidden
 
+            return f"Saving {job['rows_written']} of {job['total_rows']} rows as {job['format']}...", no_update, False, percent, f"{percent}%", progress_shown
 
-        return location_map, assembly_level_graph, annotation_graph, submission_year_text, atypical_output, suppressed_output, genome_count, sequencing_technologies_over_the_years, submissions_over_the_years, coverage_depth_bar, coverage_depth_text, coverage_null_text, ani_score_scatter, ani_identity_null_text, ani_score_text, ani_coverage_null_text, n50l50_output_text, n50l50_scatter, [total_gene_text, total_gene_dist], total_gene_null_text, [cds_text, cds_dist], cds_null_text, [non_coding_text, non_coding_dist], non_coding_null_text, [pseudogene_text, pseudogene_dist], pseudogene_null_text, [bioproject_options, bioproject_dropdown], bioproject_output, [biosample_options, biosample_dropdown], biosample_output, source_category_options, source_options, sample_options, [treemap_text, isolation_treemap], save_message
+        return no_update, no_update, no_update, no_update, no_update, no_update
+
+    if timings_panel:
+        @meta_mined.callback(
+            Output('timings-panel', 'children'),
+            Input('timings-interval', 'n_intervals')
+        )
+        def update_timings_panel(n_intervals):
+            lines = [f"{'stage':<60}{'count':>8}{'mean ms':>10}{'max ms':>10}{'last KB':>10}"]
+            for name, stage in timings.stats()['stages'].items():
+                # the panel's own polling is left out
+                if name.startswith('callback.timings-panel'):
+                    continue
+                last_kb = f"{stage['last_bytes'] / 1024:.1f}" if stage['last_bytes'] is not None else ''
+                lines.append(f"{name:<60}{stage['count']:>8}{stage['mean_ms']:>10.1f}{stage['max_ms']:>10.1f}{last_kb:>10}")
+            return '\n'.join(lines)
 
     
         # webbrowser.open("http://localhost:8050")
     
     
+    return meta_mined
+
+
+def meta_mined(df: pd.DataFrame, saving_file_path:str = None, summary:dict = None, timings_panel:bool = False):
+    # single-process server for the desktop application; see `create_server` for serving several users
+    app = create_app(df, saving_file_path=saving_file_path, summary=summary, timings_panel=timings_panel)
+
     # meta_mined.run_server(debug=True, port=8050)
-    meta_mined.run(debug=True, port=8050)  # Turn off reloader if inside Jupyter
+    app.run(debug=True, port=8050)  # Turn off reloader if inside Jupyter
+
+
+def create_server(tsv_path:str = None, saving_file_path:str = None):
+    """WSGI application for a multi-process server, e.g.
+
+        METAMINER_METADATA=Allmetadata.tsv gunicorn --preload --workers 4 'dashboard:create_server()'
+
+    `--preload` is needed for the workers to share memory: the app, with its filter arrays, title indexes and
+    count cube, is then built once and the forked workers share it copy-on-write. Without it every worker loads
+    the metadata and builds the app on its own; the dataset cache is still built only once (the first worker
+    holds its lock while the others wait), but each worker keeps its own copy of everything except the
+    memory-mapped column files.
+
+    Debug mode stays off, and exports run on each worker's background job queue, with their progress shared
+    through `.metaminer_jobs` in the saving directory so any worker can answer the progress poll. `METAMINER_TIMINGS_PANEL=1` adds the
+    pipeline timings panel to the page; the timings of each worker are served at `/_metaminer/timings`.
+    """
+    tsv_path = tsv_path or os.environ['METAMINER_METADATA']
+    saving_file_path = saving_file_path or os.environ.get('METAMINER_SAVE_DIR') or os.getcwd()
+
+    # per-update debug logging from every worker is too much for one log file
+    logging.getLogger().setLevel(os.environ.get('METAMINER_LOG_LEVEL', 'INFO'))
+
+    df, summary = load_metadata(tsv_path)
+    logging.info(f"Serving {tsv_path} ({len(df)} rows) from process {os.getpid()}.")
+
+    app = create_app(df, saving_file_path=saving_file_path, summary=summary, job_status_dir=os.path.join(saving_file_path, '.metaminer_jobs'), timings_panel=os.environ.get('METAMINER_TIMINGS_PANEL') == '1')
+    return app.server
 
 # if __name__ == '__main__':
 # import pickle
@@ -1448,7 +1912,7 @@ def meta_mined(df: pd.DataFrame, saving_file_path:str = None):
 
 
 if __name__ == '__main__':
-    df = pd.read_csv('./tmp/Allmetadata_2025-04-28_18-31-04.951296.tsv', sep='\t', low_memory=False)
+    df, summary = load_metadata('./tmp/Allmetadata_2025-04-28_18-31-04.951296.tsv')
 
     # print(df.shape)Allmetadata_2025-01-28_19-20-08.193277
 
@@ -1458,4 +1922,4 @@ if __name__ == '__main__':
 
     print(type(df))
 
-    meta_mined(df, saving_file_path=None)
\ No newline at end of file
+    meta_mined(df, saving_file_path=None, summary=summary)
\ No newline at end of file
@@ -0,0 +1,377 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import io
+import os
+import shutil
+import time
+import logging
+from contextlib import contextmanager
+
+
+CACHE_FORMAT_VERSION = 2
+
+# explicit column types of the normalized metadata; the remaining columns keep the type `pd.read_csv` infers,
+# with text columns stored as categories
+SCHEMA = {
+    'Coverage_Depth': 'float64',
+    'Total_genes': 'float64',
+    'Protein-coding_genes': 'float64',
+    'Non-coding_genes': 'float64',
+    'Pseudogenes': 'float64',
+    'ANI_best_match_score': 'float64',
+    'ANI_best_matched_assembly\'s_coverage': 'float64',
+    'Contig_N50': 'float64',
+    'Contig_L50': 'float64',
+    'Assembly_level': 'category',
+    'Annotation_category': 'category',
+    'Assembly_status': 'category',
+    'Assmbly_atypical?': 'category',
+    'country_common_name': 'category',
+    'country_three_lettered_name': 'category',
+    'state_name': 'category',
+    'state_code': 'category',
+    'Categorized_sequencing_technologies': 'category',
+    'identified_host': 'category',
+    'source_category': 'category',
+    'source': 'category',
+    'sample': 'category',
+    'Bioproject_title': 'category',
+    'Biosample_title': 'category',
+}
+
+SLIDER_COLUMNS = ['Contig_N50', 'Contig_L50', 'Total_genes', 'Protein-coding_genes', 'Non-coding_genes', 'Pseudogenes']
+
+# bytes at the end of the cached source that have to be unchanged for the new source to count as an append
+SOURCE_TAIL_BYTES = 65536
+
+
+def normalize_metadata(df:pd.DataFrame):
+    # rename the column if source_y is present
+    if 'source_y' in df.columns:
+        logging.debug(f"`source_y` column is present in the dataframe. Renaming it to `source`")
+        df.rename(columns={'source_y': 'source'}, inplace=True)
+    elif 'source' in df.columns:
+        logging.debug(f"`source` column only is there in the dataframe.")
+
+    # for sliders making sure the columns are numeric
+    for col, dtype in SCHEMA.items():
+        if dtype == 'float64' and col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    return df
+
+
+def summarize_metadata(df:pd.DataFrame):
+    # for country drop-down
+    country_dropdown_options = sorted(df['country_common_name'].dropna().astype(str).unique())
+
+    # for sequencing technology drop-down
+    sequencing_technology_options = sorted(df['Categorized_sequencing_technologies'].dropna().astype(str).unique())
+
+    slider_bounds = {col: column_bounds(df[col]) for col in SLIDER_COLUMNS}
+
+    return {
+        'country_dropdown_options': ['World'] + country_dropdown_options,
+        'sequencing_technology_options': ['All'] + sequencing_technology_options,
+        'slider_bounds': slider_bounds,
+    }
+
+
+def column_bounds(series:pd.Series):
+    if series.isnull().all():
+        return None
+    return [int(series.min()), int(series.max())]
+
+
+def merge_summaries(summary:dict, new_summary:dict):
+    merged_bounds = {}
+    for col, bounds in summary['slider_bounds'].items():
+        new_bounds = new_summary['slider_bounds'][col]
+        if bounds is None or new_bounds is None:
+            merged_bounds[col] = bounds or new_bounds
+        else:
+            merged_bounds[col] = [min(bounds[0], new_bounds[0]), max(bounds[1], new_bounds[1])]
+
+    return {
+        'country_dropdown_options': ['World'] + sorted(set(summary['country_dropdown_options'][1:]) | set(new_summary['country_dropdown_options'][1:])),
+        'sequencing_technology_options': ['All'] + sorted(set(summary['sequencing_technology_options'][1:]) | set(new_summary['sequencing_technology_options'][1:])),
+        'slider_bounds': merged_bounds,
+    }
+
+
+def file_fingerprint(path:str):
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(max(0, stat.st_size - SOURCE_TAIL_BYTES))
+        tail = f.read(SOURCE_TAIL_BYTES)
+
+    return {
+        'path': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'header_sha1': hashlib.sha1(header).hexdigest(),
+        'tail_sha1': hashlib.sha1(tail).hexdigest(),
+        'ends_with_newline': tail.endswith(b'\n'),
+    }
+
+
+def appended_bytes(path:str, source:dict):
+    # returns the bytes added to `path` since `source` was fingerprinted, or None if the file was changed otherwise
+    size = os.stat(path).st_size
+    if size <= source['size'] or not source['ends_with_newline']:
+        return None
+
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(max(0, source['size'] - SOURCE_TAIL_BYTES))
+        tail = f.read(source['size'] - max(0, source['size'] - SOURCE_TAIL_BYTES))
+        new_bytes = f.read()
+
+    if hashlib.sha1(header).hexdigest() != source['header_sha1'] or hashlib.sha1(tail).hexdigest() != source['tail_sha1']:
+        return None
+
+    return header, new_bytes
+
+
+class DatasetCache:
+    """Typed columnar copy of the normalized metadata: one memory-mapped file per column plus a JSON manifest."""
+
+    def __init__(self, cache_dir:str):
+        self.cache_dir = cache_dir
+        self.manifest_path = os.path.join(cache_dir, 'manifest.json')
+
+    def manifest(self):
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if manifest.get('version') != CACHE_FORMAT_VERSION:
+            return None
+        return manifest
+
+    def column_path(self, i:int):
+        return os.path.join(self.cache_dir, f'{i}.bin')
+
+    def categories_path(self, i:int):
+        return os.path.join(self.cache_dir, f'{i}.categories.json')
+
+    def build(self, df:pd.DataFrame, source:dict = None):
+        # written next to the old cache and swapped in, so a failed build never leaves a half-written cache behind;
+        # the directory is per process, and `load_metadata` holds `cache_lock` so only one process builds at a time
+        build_dir = f'{self.cache_dir}.building-{os.getpid()}'
+        shutil.rmtree(build_dir, ignore_errors=True)
+        os.makedirs(build_dir)
+
+        columns = []
+        for i, col in enumerate(df.columns):
+            dtype = SCHEMA.get(col)
+            if dtype is None:
+                dtype = str(df[col].dtype) if df[col].dtype.kind in 'biuf' else 'category'
+
+            if dtype == 'category':
+                codes, categories = pd.factorize(df[col], use_na_sentinel=True)
+                storage = code_storage(len(categories))
+                values = codes.astype(storage)
+                with open(os.path.join(build_dir, f'{i}.categories.json'), 'w', encoding='utf-8') as f:
+                    json.dump([category_value(category) for category in categories], f)
+                columns.append({'name': col, 'dtype': 'category', 'storage': storage})
+            else:
+                values = df[col].to_numpy(dtype=dtype)
+                columns.append({'name': col, 'dtype': dtype, 'storage': dtype})
+
+            np.ascontiguousarray(values).tofile(os.path.join(build_dir, f'{i}.bin'))
+
+        manifest = {
+            'version': CACHE_FORMAT_VERSION,
+            'n_rows': len(df),
+            'columns': columns,
+            'source': source,
+            'summary': summarize_metadata(df),
+        }
+        with open(os.path.join(build_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.replace(build_dir, self.cache_dir)
+        logging.info(f"Dataset cache built at {self.cache_dir} with {len(df)} rows and {len(columns)} columns.")
+
+    def append(self, df:pd.DataFrame, source:dict = None):
+        # raises ValueError if the new rows do not fit the cached schema; the caller should then rebuild
+        manifest = self.manifest()
+        if manifest is None:
+            raise ValueError("There is no dataset cache to append to.")
+
+        if [column['name'] for column in manifest['columns']] != list(df.columns):
+            raise ValueError("The appended rows do not have the cached columns.")
+
+        n_rows = manifest['n_rows']
+        encoded = []
+        for i, column in enumerate(manifest['columns']):
+            series = df[column['name']]
+
+            if column['dtype'] == 'category':
+                with open(self.categories_path(i), encoding='utf-8') as f:
+                    categories = json.load(f)
+                n_categories = len(categories)
+
+                present = series.notnull().to_numpy()
+                values = pd.Index(categories, dtype=object).get_indexer(series.astype(object))
+                new_categories = pd.unique(series[present & (values < 0)].astype(object))
+                if len(new_categories):
+                    categories.extend(category_value(category) for category in new_categories)
+                    values = pd.Index(categories, dtype=object).get_indexer(series.astype(object))
+                    if code_storage(len(categories)) != column['storage']:
+                        raise ValueError(f"Column {column['name']} needs wider category codes.")
+                values = np.where(present, values, -1).astype(column['storage'])
+                encoded.append((i, values, categories if len(categories) > n_categories else None))
+            else:
+                encoded.append((i, coerce_numeric(series, column['name'], column['dtype']), None))
+
+        for i, values, categories in encoded:
+            itemsize = np.dtype(manifest['columns'][i]['storage']).itemsize
+            with open(self.column_path(i), 'r+b') as f:
+                # drop whatever a previously interrupted append may have left after the last committed row
+                f.truncate(n_rows * itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(np.ascontiguousarray(values).tobytes())
+
+            if categories is not None:
+                write_json_atomic(self.categories_path(i), categories)
+
+        manifest['n_rows'] = n_rows + len(df)
+        manifest['source'] = source
+        manifest['summary'] = merge_summaries(manifest['summary'], summarize_metadata(df))
+        write_json_atomic(self.manifest_path, manifest)
+        logging.info(f"Appended {len(df)} rows to the dataset cache at {self.cache_dir}.")
+
+    def load(self):
+        manifest = self.manifest()
+        n_rows = manifest['n_rows']
+
+        data = {}
+        for i, column in enumerate(manifest['columns']):
+            if n_rows == 0:
+                values = np.empty(0, dtype=column['storage'])
+            else:
+                values = np.memmap(self.column_path(i), dtype=column['storage'], mode='r', shape=(n_rows,))
+
+            if column['dtype'] == 'category':
+                with open(self.categories_path(i), encoding='utf-8') as f:
+                    categories = pd.Index(json.load(f), dtype=object)
+                data[column['name']] = pd.Categorical.from_codes(values, categories=categories)
+            else:
+                data[column['name']] = values
+
+        df = pd.DataFrame(data, copy=False)
+        return df, manifest['summary']
+
+
+def code_storage(n_categories:int) -> str:
+    # the code width pandas picks for this many categories, so `pd.Categorical.from_codes` keeps the memory-mapped codes instead of copying them
+    for dtype in ['int8', 'int16', 'int32']:
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return 'int64'
+
+
+def category_value(value):
+    # numpy scalars are not JSON serializable
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def coerce_numeric(series:pd.Series, name:str, dtype:str):
+    if SCHEMA.get(name) == 'float64':
+        return pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64)
+
+    if dtype == 'bool':
+        if series.dtype != bool:
+            raise ValueError(f"Column {name} is no longer boolean.")
+        return series.to_numpy(dtype=bool)
+
+    values = pd.to_numeric(series, errors='raise')
+    if np.dtype(dtype).kind in 'iu' and (values.isnull().any() or (values != values.round()).any()):
+        raise ValueError(f"Column {name} is no longer an integer column.")
+    return values.to_numpy(dtype=dtype)
+
+
+def write_json_atomic(path:str, obj):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(obj, f)
+    os.replace(path + '.tmp', path)
+
+
+@contextmanager
+def cache_lock(cache_dir:str):
+    # an exclusive lock on `<cache_dir>.lock`: the first server worker builds or appends, the others wait and then load its cache
+    os.makedirs(os.path.dirname(os.path.abspath(cache_dir)), exist_ok=True)
+    with open(cache_dir + '.lock', 'a+b') as f:
+        if os.name == 'nt':
+            import msvcrt
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+        try:
+            yield
+        finally:
+            if os.name == 'nt':
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def read_metadata_tsv(source, category_columns:list = None):
+    # text columns are read as strings so that the full build and later appends encode the same values
+    if category_columns is None:
+        category_columns = [col for col, dtype in SCHEMA.items() if dtype == 'category']
+    if 'source' in category_columns:
+        category_columns = category_columns + ['source_y']
+
+    df = pd.read_csv(source, sep='\t', low_memory=False, dtype={col: str for col in category_columns})
+    return normalize_metadata(df)
+
+
+def load_metadata(tsv_path:str, cache_dir:str = None):
+    # returns the normalized metadata and its precomputed dropdown options and slider bounds
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(tsv_path)), '.metaminer_cache', os.path.basename(tsv_path))
+
+    cache = DatasetCache(cache_dir)
+    with cache_lock(cache_dir):
+        manifest = cache.manifest()
+        source = file_fingerprint(tsv_path)
+
+        if manifest is not None and manifest['source'] is not None:
+            cached_source = manifest['source']
+
+            if cached_source['size'] == source['size'] and cached_source['mtime_ns'] == source['mtime_ns'] and cached_source['path'] == source['path']:
+                logging.debug(f"Loading the metadata from the dataset cache at {cache_dir}.")
+                return cache.load()
+
+            appended = appended_bytes(tsv_path, cached_source) if cached_source['path'] == source['path'] else None
+            if appended is not None:
+                header, new_bytes = appended
+                category_columns = [column['name'] for column in manifest['columns'] if column['dtype'] == 'category']
+                try:
+                    new_rows = read_metadata_tsv(io.BytesIO(header + new_bytes), category_columns=category_columns)
+                    cache.append(new_rows, source=source)
+                    return cache.load()
+                except ValueError as e:
+                    logging.info(f"Rebuilding the dataset cache as the appended rows could not be added: {e}")
+
+        logging.info(f"Building the dataset cache for {tsv_path}.")
+        cache.build(read_metadata_tsv(tsv_path), source=source)
+        return cache.load()
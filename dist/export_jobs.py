@@ -0,0 +1,181 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from datetime import datetime
+import importlib.util
+import io
+import pandas as pd
+import numpy as np
+import threading
+import gzip
+import json
+import uuid
+import os
+import logging
+from dataset_cache import write_json_atomic
+
+
+# file extension of every export format, and the optional package it needs
+EXPORT_FORMATS = {
+    'tsv': ('.tsv', None),
+    'tsv.gz': ('.tsv.gz', None),
+    'tsv.zst': ('.tsv.zst', 'zstandard'),
+    'parquet': ('.parquet', 'pyarrow'),
+}
+
+EXPORT_CHUNK_ROWS = 50000
+
+# finished jobs kept for the progress display
+MAX_FINISHED_JOBS = 20
+
+# rows sampled across the selection to fix the parquet schema before the first chunk is written
+PARQUET_SCHEMA_SAMPLE_ROWS = 10000
+
+
+def available_formats() -> list:
+    return [fmt for fmt, (_, package) in EXPORT_FORMATS.items() if package is None or importlib.util.find_spec(package) is not None]
+
+
+def open_tsv(path:str, fmt:str):
+    if fmt == 'tsv':
+        return open(path, 'w', encoding='utf-8', newline='')
+    if fmt == 'tsv.gz':
+        return gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=6)
+
+    import zstandard
+    return io.TextIOWrapper(zstandard.ZstdCompressor(level=3).stream_writer(open(path, 'wb')), encoding='utf-8', newline='')
+
+
+def write_tsv(chunks, path:str, fmt:str, progress):
+    with open_tsv(path, fmt) as handle:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(handle, index=False, sep='\t', header=i == 0)
+            progress(len(chunk))
+
+
+def parquet_schema(sample:pd.DataFrame):
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(sample, preserve_index=False)
+    # columns that are empty in the sample are written as strings, so later chunks with values still fit
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, pa.field(field.name, pa.string()))
+    return schema
+
+
+def write_parquet(chunks, path:str, sample:pd.DataFrame, progress):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema(sample)
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            progress(len(chunk))
+
+
+class ExportJobs:
+    """Exports of row selections written by a background thread, with progress that the dashboard polls."""
+
+    def __init__(self, max_workers:int = 1, status_dir:str = None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='metaminer-export')
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        # with several server processes the progress poll can reach another process, so job states are also written here
+        self.status_dir = status_dir
+        if status_dir is not None:
+            os.makedirs(status_dir, exist_ok=True)
+
+    def submit(self, frame, rows:np.ndarray, saving_file_path:str, fmt:str, manifest:dict) -> str:
+        """Start writing `frame(rows_chunk)` for all `rows`; returns the job id used by `status`."""
+        if fmt not in available_formats():
+            raise ValueError(f"Export format {fmt} is not available. Available formats: {available_formats()}")
+
+        date_time = str(datetime.now()).replace(" ", "_").replace(":", "-")
+        saving_file_as = os.path.abspath(os.path.join(saving_file_path, f"filtered_data_{date_time}{EXPORT_FORMATS[fmt][0]}"))
+
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self.jobs[job_id] = {
+                'state': 'queued',
+                'format': fmt,
+                'path': saving_file_as,
+                'manifest_path': f"{saving_file_as}.manifest.json",
+                'rows_written': 0,
+                'total_rows': len(rows),
+                'error': None,
+            }
+            self.forget_finished()
+        self.save(job_id)
+
+        self.executor.submit(self.run, job_id, frame, rows, manifest)
+        logging.debug(f"Export job {job_id} queued: {len(rows)} rows to {saving_file_as}")
+        return job_id
+
+    def run(self, job_id:str, frame, rows:np.ndarray, manifest:dict):
+        job = self.jobs[job_id]
+        job['state'] = 'running'
+        self.save(job_id)
+        # written under a temporary name, so an unfinished export never looks like a complete file
+        partial_path = f"{job['path']}.part"
+
+        def progress(n_rows):
+            job['rows_written'] += n_rows
+            self.save(job_id)
+
+        chunks = (frame(rows[start:start + EXPORT_CHUNK_ROWS]) for start in range(0, max(len(rows), 1), EXPORT_CHUNK_ROWS))
+
+        try:
+            if job['format'] == 'parquet':
+                sample_rows = rows[np.linspace(0, len(rows) - 1, min(len(rows), PARQUET_SCHEMA_SAMPLE_ROWS)).astype(np.int64)] if len(rows) else rows
+                write_parquet(chunks, partial_path, frame(sample_rows), progress)
+            else:
+                write_tsv(chunks, partial_path, job['format'], progress)
+
+            os.replace(partial_path, job['path'])
+
+            manifest = dict(manifest, file=os.path.basename(job['path']), format=job['format'], rows=len(rows), created=str(datetime.now()))
+            with open(job['manifest_path'], 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2, default=str)
+
+            job['state'] = 'done'
+            self.save(job_id)
+            logging.info(f"File saved successfully at {job['path']}")
+        except Exception as e:
+            job['state'] = 'failed'
+            job['error'] = str(e)
+            self.save(job_id)
+            logging.info(f"Error saving file: {str(e)}")
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+    def status_path(self, job_id:str) -> str:
+        return os.path.join(self.status_dir, f'{job_id}.json')
+
+    def save(self, job_id:str):
+        if self.status_dir is None:
+            return
+        with self.lock:
+            job = dict(self.jobs[job_id])
+        write_json_atomic(self.status_path(job_id), job)
+
+    def status(self, job_id:str) -> dict:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+
+        if self.status_dir is None or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        try:
+            with open(self.status_path(job_id), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def forget_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job['state'] in ('done', 'failed')]
+        for job_id in finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+            del self.jobs[job_id]
+            if self.status_dir is not None and os.path.exists(self.status_path(job_id)):
+                os.remove(self.status_path(job_id))
@@ -0,0 +1,187 @@
+import pandas as pd
+import numpy as np
+import logging
+
+
+# columns that the dashboard filters with `==` / `isin`
+CATEGORICAL_COLUMNS = [
+    'country_common_name',
+    'Assembly_level',
+    'Annotation_category',
+    'Assmbly_atypical?',
+    'Assembly_status',
+    'Categorized_sequencing_technologies',
+    'Bioproject_title',
+    'Biosample_title',
+    'identified_host',
+    'source_category',
+    'source',
+    'sample',
+]
+
+# columns that the dashboard filters with range sliders
+NUMERIC_COLUMNS = [
+    'Submission_year',
+    'Coverage_Depth',
+    'ANI_best_match_score',
+    'ANI_best_matched_assembly\'s_coverage',
+    'Contig_N50',
+    'Contig_L50',
+    'Total_genes',
+    'Protein-coding_genes',
+    'Non-coding_genes',
+    'Pseudogenes',
+]
+
+
+def stringify_dict_columns(df:pd.DataFrame):
+    for col in df.columns:
+        # only object columns can hold dictionaries; typed and categorical columns from the dataset cache are skipped
+        if df[col].dtype == object and df[col].apply(lambda x: isinstance(x, dict)).any():
+            logging.debug(f"Converting {col} data to string values as dictionaries may cause problem in filtering/removing duplicates.")
+            df[col] = df[col].apply(str)
+
+    return df
+
+
+class FilterEngine:
+    """Column arrays of the metadata table, built once so that every widget becomes a boolean mask."""
+
+    def __init__(self, df:pd.DataFrame):
+        # a shallow copy, so a memory-mapped dataset is not read into memory; replaced columns do not touch `df`
+        self.df = stringify_dict_columns(df.copy(deep=False))
+        self.n_rows = len(self.df)
+        self.n_columns = self.df.shape[1]
+
+        self.codes = {}
+        self.categories = {}
+        self.category_index = {}
+        for col in CATEGORICAL_COLUMNS:
+            if col in self.df.columns:
+                if isinstance(self.df[col].dtype, pd.CategoricalDtype):
+                    # the compact codes of a categorical column are reused instead of factorizing an int64 copy
+                    codes, uniques = self.df[col].cat.codes.to_numpy(), self.df[col].cat.categories
+                else:
+                    codes, uniques = pd.factorize(self.df[col], use_na_sentinel=True)
+                self.codes[col] = codes
+                self.categories[col] = np.asarray(uniques, dtype=object)
+                self.category_index[col] = pd.Index(self.categories[col], dtype=object)
+
+        self.numbers = {}
+        for col in NUMERIC_COLUMNS:
+            if col in self.df.columns:
+                if self.df[col].dtype == np.float64:
+                    # a view, so a memory-mapped column stays shared between processes
+                    self.numbers[col] = self.df[col].to_numpy()
+                else:
+                    self.numbers[col] = pd.to_numeric(self.df[col], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+
+        logging.debug(f"Filter engine built for {self.n_rows} rows with {len(self.codes)} categorical and {len(self.numbers)} numeric columns.")
+
+    def isin(self, column:str, values) -> np.ndarray:
+        lookup = np.zeros(len(self.categories[column]) + 1, dtype=bool)  # last slot is for missing values (code -1)
+
+        values = list(values)
+        wanted = [value for value in values if not pd.isnull(value)]
+        if len(wanted) < len(values):
+            lookup[-1] = True
+
+        found = self.category_index[column].get_indexer(pd.Index(wanted, dtype=object))
+        lookup[found[found >= 0]] = True
+
+        return lookup[self.codes[column]]
+
+    def equals(self, column:str, value) -> np.ndarray:
+        if pd.isnull(value):
+            return np.zeros(self.n_rows, dtype=bool)
+        return self.isin(column, [value])
+
+    def between(self, column:str, low, high) -> np.ndarray:
+        values = self.numbers[column]
+        return (values >= low) & (values <= high)
+
+    def greater(self, column:str, low) -> np.ndarray:
+        return self.numbers[column] > low
+
+    def isnull(self, column:str) -> np.ndarray:
+        if column in self.numbers:
+            return np.isnan(self.numbers[column])
+        return self.codes[column] < 0
+
+    def notnull(self, column:str) -> np.ndarray:
+        return ~self.isnull(column)
+
+    def labels(self, column:str, codes:np.ndarray) -> np.ndarray:
+        # the values of category codes, NaN for code -1
+        labels = np.empty(len(codes), dtype=object)
+        labels[codes >= 0] = self.categories[column][codes[codes >= 0]]
+        labels[codes < 0] = np.nan
+        return labels
+
+    def select(self):
+        return Selection(self)
+
+    def frame(self, rows:np.ndarray, columns:list = None) -> pd.DataFrame:
+        df = self.df if columns is None else self.df[columns]
+        return df.take(rows).reset_index(drop=True)
+
+
+class Selection:
+    """A row selection over a FilterEngine; rows are only materialized by `frame()`."""
+
+    def __init__(self, engine:FilterEngine):
+        self.engine = engine
+        self.mask = np.ones(engine.n_rows, dtype=bool)
+        # one key per `union` stage, the last one being the most significant for the row order
+        self.order_keys = []
+        self._rows = None
+
+    @property
+    def shape(self):
+        return (self.count(), self.engine.n_columns)
+
+    def __len__(self):
+        return self.count()
+
+    def filter(self, mask:np.ndarray):
+        self.mask &= mask
+        self._rows = None
+        return self
+
+    def union(self, *pieces:np.ndarray):
+        # same rows and order as `pd.concat([modified_df[piece] for piece in pieces])` for disjoint pieces
+        key = np.full(self.engine.n_rows, len(pieces), dtype=np.int16)
+        for i in range(len(pieces) - 1, -1, -1):
+            key[pieces[i]] = i
+
+        self.mask &= key < len(pieces)
+        self.order_keys.append(key)
+        self._rows = None
+        return self
+
+    def count(self, mask:np.ndarray = None) -> int:
+        if mask is None:
+            return int(np.count_nonzero(self.mask))
+        return int(np.count_nonzero(self.mask & mask))
+
+    def rows(self) -> np.ndarray:
+        if self._rows is None:
+            rows = np.flatnonzero(self.mask)
+            if self.order_keys:
+                rows = rows[np.lexsort([key[rows] for key in self.order_keys])]
+            self._rows = rows
+        return self._rows
+
+    def unique_codes(self, column:str, matches:np.ndarray = None) -> np.ndarray:
+        # category codes in order of first appearance; `matches` (one flag per category, e.g. from a TitleIndex search) keeps only the flagged values
+        codes = pd.unique(self.engine.codes[column][self.rows()])
+        if matches is not None:
+            codes = codes[codes >= 0]
+            codes = codes[matches[codes]]
+        return codes
+
+    def unique(self, column:str, matches:np.ndarray = None) -> np.ndarray:
+        return self.engine.labels(column, self.unique_codes(column, matches=matches))
+
+    def frame(self, columns:list = None) -> pd.DataFrame:
+        return self.engine.frame(self.rows(), columns=columns)
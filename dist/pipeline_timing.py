@@ -0,0 +1,88 @@
+from flask import g, request, jsonify
+import threading
+import time
+import os
+import logging
+
+
+TIMINGS_ENDPOINT = '/_metaminer/timings'
+
+
+class Stopwatch:
+    """Records the time since the previous `lap` under `<prefix>.<stage>`."""
+
+    def __init__(self, timings, prefix:str):
+        self.timings = timings
+        self.prefix = prefix
+        self.start = self.last = time.perf_counter()
+
+    def lap(self, stage:str):
+        now = time.perf_counter()
+        self.timings.record(f'{self.prefix}.{stage}', now - self.last)
+        self.last = now
+
+    def total(self):
+        self.timings.record(f'{self.prefix}.total', time.perf_counter() - self.start)
+
+
+class PipelineTimings:
+    """Time per filter stage and per callback, and the serialized size of every callback response, for this process."""
+
+    def __init__(self):
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def record(self, name:str, seconds:float, payload_bytes:int = None):
+        with self.lock:
+            stage = self.stages.setdefault(name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0, 'last_bytes': None, 'max_bytes': None})
+            ms = seconds * 1000
+            stage['count'] += 1
+            stage['total_ms'] += ms
+            stage['max_ms'] = max(stage['max_ms'], ms)
+            stage['last_ms'] = ms
+            if payload_bytes is not None:
+                stage['last_bytes'] = payload_bytes
+                stage['max_bytes'] = max(stage['max_bytes'] or 0, payload_bytes)
+
+    def stopwatch(self, prefix:str):
+        return Stopwatch(self, prefix)
+
+    def stats(self) -> dict:
+        with self.lock:
+            stages = {name: dict(stage, mean_ms=stage['total_ms'] / stage['count']) for name, stage in sorted(self.stages.items())}
+        return {'pid': os.getpid(), 'uptime_s': time.time() - self.started, 'stages': stages}
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+
+    def instrument(self, server, extra:dict = None):
+        """Times every Dash callback request of `server` and serves `stats()` as JSON at `TIMINGS_ENDPOINT`.
+
+        `extra` maps names to functions whose results are added to the endpoint, e.g. cache statistics.
+        """
+
+        @server.before_request
+        def start_callback_timer():
+            if request.path.endswith('/_dash-update-component'):
+                g.metaminer_callback_start = time.perf_counter()
+
+        @server.after_request
+        def record_callback(response):
+            start = g.pop('metaminer_callback_start', None)
+            if start is not None:
+                body = request.get_json(silent=True) or {}
+                # callbacks are named by their first output, e.g. `callback.ani-scatter.figure`
+                output = body.get('output', 'unknown').strip('.').split('...')[0]
+                self.record(f"callback.{output}", time.perf_counter() - start, payload_bytes=response.calculate_content_length())
+            return response
+
+        @server.route(TIMINGS_ENDPOINT)
+        def timings_endpoint():
+            stats = self.stats()
+            for name, provider in (extra or {}).items():
+                stats[name] = provider()
+            return jsonify(stats)
+
+        logging.debug(f"Pipeline timings are served at {TIMINGS_ENDPOINT}.")
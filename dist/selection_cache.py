@@ -0,0 +1,79 @@
+from collections import OrderedDict
+import numpy as np
+import hashlib
+import json
+import threading
+import logging
+
+
+def state_key(state) -> str:
+    # widget values are plain JSON (lists, numbers, strings), so the dump is a stable fingerprint of the filter state
+    return hashlib.sha1(json.dumps(state, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def rows_key(rows:np.ndarray) -> str:
+    return hashlib.blake2b(np.ascontiguousarray(rows).tobytes(), digest_size=16).hexdigest()
+
+
+def array_bytes(value:dict) -> int:
+    # the arrays of a filter result (selected rows, option codes) are what takes memory; its few strings are left out
+    total = 0
+    for item in value.values():
+        for array in item.values() if isinstance(item, dict) else [item]:
+            if isinstance(array, np.ndarray):
+                total += array.nbytes
+    return total
+
+
+class SelectionCache:
+    """Bounded LRU cache of filter results keyed by `state_key` of the filter state.
+
+    Entries are compact (row indices and category codes), and the cache holds at most `max_entries` of them
+    and at most `max_bytes` of their arrays. The callbacks of a threaded server share it, so every access is locked.
+    """
+
+    def __init__(self, max_entries:int = 32, max_bytes:int = 256 << 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key:str, count:bool = True):
+        # `count=False` is for lookups of a state that was already counted, e.g. by the figure callbacks
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits += count
+            else:
+                self.misses += count
+            return value
+
+    def put(self, key:str, value:dict):
+        size = array_bytes(value)
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            self.sizes[key] = size
+
+            # the newest entry stays, even if it is larger than `max_bytes` on its own
+            while len(self.entries) > 1 and (len(self.entries) > self.max_entries or sum(self.sizes.values()) > self.max_bytes):
+                evicted, _ = self.entries.popitem(last=False)
+                del self.sizes[evicted]
+                logging.debug(f"Evicted filter state {evicted} from the selection cache.")
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'memory_bytes': sum(self.sizes.values()),
+                'max_bytes': self.max_bytes,
+            }
@@ -0,0 +1,162 @@
+import pandas as pd
+import numpy as np
+import re
+import logging
+
+
+# queries: commas separate alternatives (any of them), an '&' with whitespace on both sides joins parts that must all be found,
+# and a trailing '~' allows typos. An '&' inside a word, as in 'R&D', is a literal character, so a query without ' & ' or a
+# trailing '~' matches exactly the titles the old comma-separated substring scan matched.
+OR_SEPARATOR = ','
+AND_SEPARATOR = re.compile(r'\s+&\s+')
+FUZZY_MARKER = '~'
+
+# words shorter than this are only searched as substrings
+FUZZY_MIN_LENGTH = 4
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def code_points(text:str) -> np.ndarray:
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+
+
+def trigram_keys(chars:np.ndarray) -> np.ndarray:
+    if len(chars) < 3:
+        return np.empty(0, dtype=np.int64)
+    # 21 bits per code point, so a trigram fits in one int64
+    return (chars[:-2] << 42) | (chars[1:-1] << 21) | chars[2:]
+
+
+def trigram_postings(texts:list):
+    """Sorted distinct trigram keys of `texts`, with the ids of the texts holding each key as `ids[offsets[i]:offsets[i + 1]]`."""
+    # texts are joined by NUL characters; a trigram over a NUL belongs to no text
+    chars = code_points('\x00'.join(texts) + '\x00')
+    keys = trigram_keys(chars)
+    if len(keys) == 0:
+        return np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32)
+
+    text_ids = np.cumsum(chars == 0)[:-2]
+    valid = (chars[:-2] != 0) & (chars[1:-1] != 0) & (chars[2:] != 0)
+    keys, text_ids = keys[valid], text_ids[valid]
+
+    # a stable sort keeps the text ids of each key in increasing order, so repeated (key, text) pairs are neighbours
+    order = np.argsort(keys, kind='stable')
+    keys, text_ids = keys[order], text_ids[order]
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = (keys[1:] != keys[:-1]) | (text_ids[1:] != text_ids[:-1])
+    keys, text_ids = keys[first], text_ids[first]
+
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], np.r_[starts, len(keys)], text_ids.astype(np.int32)
+
+
+def edit_distance(a:str, b:str, max_distance:int) -> int:
+    # Levenshtein distance, cut off at `max_distance + 1`
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+
+    return previous[-1]
+
+
+class TitleIndex:
+    """Search index over distinct titles; title ids are the positions in `titles` (the FilterEngine categories)."""
+
+    def __init__(self, titles):
+        self.titles = [title.lower() if isinstance(title, str) else '' for title in titles]
+        self.n_titles = len(self.titles)
+
+        # substring search: trigrams of the lowercased titles
+        self.keys, self.offsets, self.ids = trigram_postings(self.titles)
+
+        # typo-tolerant search: the distinct words of the titles, and trigrams of those words padded with spaces
+        words = pd.Series(self.titles, dtype=object).str.findall(TOKEN_PATTERN).explode().dropna()
+        token_ids, tokens = pd.factorize(words)
+        width = max(self.n_titles, 1)
+        pairs = np.sort(token_ids.astype(np.int64) * width + words.index.to_numpy(dtype=np.int64))
+        pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]] if len(pairs) else pairs
+
+        self.tokens = list(tokens)
+        self.token_offsets = np.searchsorted(pairs // width, np.arange(len(self.tokens) + 1))
+        self.token_titles = (pairs % width).astype(np.int32)
+        self.token_lengths = np.fromiter((len(token) for token in self.tokens), dtype=np.int32, count=len(self.tokens))
+
+        self.token_keys, self.token_key_offsets, self.token_key_ids = trigram_postings([f' {token} ' for token in self.tokens])
+
+        logging.debug(f"Title index built for {self.n_titles} titles, {len(self.keys)} trigrams and {len(self.tokens)} words.")
+
+    def postings(self, key:int, keys:np.ndarray, offsets:np.ndarray, ids:np.ndarray) -> np.ndarray:
+        position = np.searchsorted(keys, key)
+        if position == len(keys) or keys[position] != key:
+            return ids[:0]
+        return ids[offsets[position]:offsets[position + 1]]
+
+    def substring(self, term:str) -> np.ndarray:
+        matches = np.zeros(self.n_titles, dtype=bool)
+
+        if len(term) < 3:
+            candidates = range(self.n_titles)
+        else:
+            # every trigram of the term has to be in the title; the rarest ones are intersected first
+            lists = sorted((self.postings(key, self.keys, self.offsets, self.ids) for key in np.unique(trigram_keys(code_points(term)))), key=len)
+            candidates = lists[0]
+            for ids in lists[1:]:
+                if len(candidates) == 0:
+                    break
+                candidates = np.intersect1d(candidates, ids, assume_unique=True)
+
+        matches[[title_id for title_id in candidates if term in self.titles[title_id]]] = True
+        return matches
+
+    def similar(self, word:str) -> np.ndarray:
+        max_distance = 1 if len(word) < 8 else 2
+        keys = np.unique(trigram_keys(code_points(f' {word} ')))
+
+        # a word within `max_distance` edits still shares all but 3 trigrams per edit
+        shared = np.bincount(
+            np.concatenate([self.postings(key, self.token_keys, self.token_key_offsets, self.token_key_ids) for key in keys] + [np.empty(0, dtype=np.int32)]),
+            minlength=len(self.tokens),
+        )
+        candidates = (shared >= len(keys) - 3 * max_distance) & (np.abs(self.token_lengths - len(word)) <= max_distance)
+
+        matches = np.zeros(self.n_titles, dtype=bool)
+        for token_id in np.flatnonzero(candidates):
+            if edit_distance(word, self.tokens[token_id], max_distance) <= max_distance:
+                matches[self.token_titles[self.token_offsets[token_id]:self.token_offsets[token_id + 1]]] = True
+        return matches
+
+    def part(self, part:str) -> np.ndarray:
+        if not part.endswith(FUZZY_MARKER):
+            return self.substring(part)
+
+        # each word of a fuzzy part is matched on its own, and all of them have to be found
+        words = TOKEN_PATTERN.findall(part[:-1])
+        matches = np.full(self.n_titles, bool(words))
+        for word in words:
+            matches &= self.similar(word) if len(word) >= FUZZY_MIN_LENGTH else self.substring(word)
+        return matches
+
+    def search(self, query:str) -> np.ndarray:
+        """Boolean array over the title ids matching `query`."""
+        matches = np.zeros(self.n_titles, dtype=bool)
+
+        for alternative in query.lower().split(OR_SEPARATOR):
+            parts = [part.strip() for part in AND_SEPARATOR.split(alternative.strip()) if part.strip()]
+            if not parts:
+                continue
+
+            found = self.part(parts[0])
+            for part in parts[1:]:
+                found &= self.part(part)
+            matches |= found
+
+        return matches
@@ -0,0 +1,14 @@
+import importlib
+import logging
+import os
+import sys
+
+DIST = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dist')
+sys.path.insert(0, DIST)
+
+# with a handler on the root logger, dashboard.py does not open `dash.log` in the working directory
+logging.getLogger().addHandler(logging.NullHandler())
+
+# dashboard.py imports the figures as `dash_graphs`; the module in dist/ is named `dahs_graphs.py`
+if not os.path.exists(os.path.join(DIST, 'dash_graphs.py')):
+    sys.modules['dash_graphs'] = importlib.import_module('dahs_graphs')
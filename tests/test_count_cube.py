@@ -0,0 +1,139 @@
+"""The count cubes against the row filter: an app answering from the cubes and one filtering rows show the same page."""
+import numpy as np
+import pandas as pd
+import pytest
+from benchmark import synthetic_metadata, HeadlessDashboard, SEQUENCING_TECHNOLOGIES, HOSTS
+from count_cube import CountCubes, HISTOGRAM_COLUMNS, histogram_bins, bin_codes
+from filter_engine import FilterEngine
+from dashboard import create_app
+from pipeline_timing import TIMINGS_ENDPOINT
+
+N_ROWS = 4000
+N_STATES = 20
+
+HISTOGRAMS = {'total-gene-hist': 'Total_genes', 'cds-hist': 'Protein-coding_genes', 'non-coding-hist': 'Non-coding_genes', 'pseudogene-hist': 'Pseudogenes'}
+# ids of the values that differ by design: the stores hold different row keys
+SKIPPED = {'filtered-rows', 'filter-state'}
+
+
+def metadata() -> pd.DataFrame:
+    df = synthetic_metadata(N_ROWS, seed=4)
+    # the page's default filters drop genomes without an N50 or L50, which the atypical and suppressed texts still count
+    rng = np.random.default_rng(6)
+    for col in ['Contig_N50', 'Contig_L50']:
+        df.loc[rng.choice(len(df), size=N_ROWS // 20, replace=False), col] = np.nan
+    return df
+
+
+def random_subset(rng, values):
+    values = list(values)
+    return [v for v in values if rng.random() < 0.6] or [values[0]]
+
+
+def narrowed_state(rng, df:pd.DataFrame, defaults:dict) -> dict:
+    """Widget values that only narrow the categorical filters of the page's defaults."""
+    state = {}
+    if rng.random() < 0.3:
+        # other countries need geojson files that are not shipped with the tests
+        state['country-dropdown'] = 'United States'
+    if rng.random() < 0.5:
+        state['assembly-level-checklist'] = random_subset(rng, defaults['assembly-level-checklist'])
+    if rng.random() < 0.3:
+        state['annotation-checklist'] = random_subset(rng, defaults['annotation-checklist'])
+    if rng.random() < 0.4:
+        low, high = defaults['submission-year-slider']
+        state['submission-year-slider'] = sorted(int(year) for year in rng.integers(low, high + 1, size=2))
+    state['atypical-radio'] = rng.choice(['all', 'no_atypical', 'only_atypical'])
+    state['suppressed-radio'] = rng.choice(['all', 'no_suppressed', 'only_suppressed'])
+    if rng.random() < 0.3:
+        state['sequencing-technology-dropdown'] = random_subset(rng, SEQUENCING_TECHNOLOGIES)
+    if rng.random() < 0.3:
+        state['identified-host-dropdown'] = random_subset(rng, HOSTS)
+    if rng.random() < 0.4:
+        state['source-category-dropdown'] = list(rng.choice(df['source_category'].dropna().unique(), size=2))
+        if rng.random() < 0.5:
+            state['source-dropdown'] = list(rng.choice(df['source'].dropna().unique(), size=4))
+    return {(component_id, 'value'): value for component_id, value in state.items()}
+
+
+@pytest.fixture(scope='module')
+def dashboards(tmp_path_factory):
+    cube_app = create_app(metadata(), saving_file_path=str(tmp_path_factory.mktemp('exports')))
+    row_app = create_app(metadata(), saving_file_path=str(tmp_path_factory.mktemp('exports')), use_count_cubes=False)
+    return HeadlessDashboard(cube_app), HeadlessDashboard(row_app)
+
+
+def test_cubes_show_the_page_of_the_row_filter(dashboards):
+    cubes, rows = dashboards
+    df = metadata()
+    filter_output = next(output for output in cubes.app.callback_map if 'filtered-rows.data' in output)
+    input_ids = [i['id'] for i in cubes.app.callback_map[filter_output]['inputs']]
+    defaults = {component_id: cubes.values.get((component_id, 'value')) for component_id in input_ids}
+    initial = dict(cubes.values)
+    bins = {col: histogram_bins(pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float, na_value=np.nan)) for col in HISTOGRAM_COLUMNS}
+
+    cubes.change({})
+    rows.change({})
+    row_filter_runs = cubes.get_json(TIMINGS_ENDPOINT)['stages']['filter.total']['count']
+
+    rng = np.random.default_rng(5)
+    for i in range(N_STATES):
+        state = narrowed_state(rng, df, defaults)
+        failures = []
+        for headless in (cubes, rows):
+            headless.values = dict(initial)
+            try:
+                headless.change(state)
+                failures.append(None)
+            except RuntimeError as e:
+                failures.append(str(e))
+        # some figures of the original fail on an empty selection; both apps have to fail in the same callback
+        assert failures[0] == failures[1], f"state {i}: {state}"
+        if failures[0] is not None:
+            continue
+
+        for key, value in rows.values.items():
+            if key[0] not in SKIPPED:
+                assert cubes.values[key] == value, f"{key} differs for state {i}: {state}"
+
+        values = [cubes.values.get((component_id, 'value')) for component_id in input_ids]
+        selected = rows.app.selected_rows({'values': values, 'triggered_id': None})
+        np.testing.assert_array_equal(cubes.app.selected_rows({'values': values, 'triggered_id': None}), selected)
+
+        for graph_id, col in HISTOGRAMS.items():
+            numbers = pd.to_numeric(df[col].iloc[selected], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            expected = np.bincount(bin_codes(numbers, bins[col]) + 1, minlength=bins[col]['n_bins'] + 1)[1:]
+            assert cubes.values[(graph_id, 'figure')]['data'][0]['y'] == expected.tolist(), f"{graph_id} differs for state {i}: {state}"
+
+    # every state was answered from the cubes, so the row filter only ran for the initial state
+    assert cubes.get_json(TIMINGS_ENDPOINT)['stages']['filter.total']['count'] == row_filter_runs
+
+
+@pytest.mark.parametrize('categorical', [False, True])
+def test_counts_match_groupby(categorical):
+    df = synthetic_metadata(3000, seed=8)
+    if categorical:
+        # as the dataset cache loads them
+        df = df.astype({col: 'category' for col in ['Assembly_level', 'identified_host', 'source_category', 'source', 'sample']})
+    engine = FilterEngine(df)
+    rng = np.random.default_rng(9)
+    base_rows = rng.permutation(len(df))[:2500].astype(np.int32)
+    cubes = CountCubes(engine, base_rows)
+    base = df.iloc[base_rows]
+
+    for _ in range(20):
+        levels = random_subset(rng, df['Assembly_level'].dropna().unique())
+        low, high = sorted(int(year) for year in rng.integers(df['Submission_year'].min(), df['Submission_year'].max() + 1, size=2))
+        filters = {'Assembly_level': cubes.isin('Assembly_level', levels), 'Submission_year': cubes.between('Submission_year', low, high)}
+        selected = base[base['Assembly_level'].isin(levels) & base['Submission_year'].between(low, high)]
+
+        np.testing.assert_array_equal(cubes.rows_of(filters), base_rows[base['Assembly_level'].isin(levels).to_numpy() & base['Submission_year'].between(low, high).to_numpy()])
+        assert cubes.count(filters) == len(selected)
+
+        for columns, dropna in [(['Assembly_level'], True), (['Submission_year', 'Categorized_sequencing_technologies'], True), (['identified_host', 'source_category', 'source', 'sample'], False)]:
+            expected = selected.groupby(columns, observed=True, dropna=dropna).size().reset_index(name='count')
+            pd.testing.assert_frame_equal(cubes.counts_by(columns, filters, dropna=dropna), expected)
+
+        assert list(engine.labels('source', cubes.unique_codes('source', filters))) == list(pd.unique(selected['source'].astype(object)))
+        coverage = selected['Coverage_Depth']
+        assert cubes.value_range('Coverage_Depth', filters) == (coverage.min(), coverage.max()) or coverage.isnull().all()
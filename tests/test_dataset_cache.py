@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+from benchmark import synthetic_metadata
+from dataset_cache import DatasetCache
+from filter_engine import FilterEngine
+
+
+def memory_mapped(array:np.ndarray) -> bool:
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return False
+
+
+def test_categorical_codes_stay_memory_mapped(tmp_path):
+    df = synthetic_metadata(2000, seed=5)
+    cache = DatasetCache(str(tmp_path / 'cache'))
+    cache.build(df)
+    loaded, _ = cache.load()
+
+    engine = FilterEngine(loaded)
+    for col, codes in engine.codes.items():
+        assert memory_mapped(codes), col
+    for col, values in engine.numbers.items():
+        # integer columns such as the submission year are converted to float by the engine
+        if loaded[col].dtype == np.float64:
+            assert memory_mapped(values), col
+
+    for col in df.columns:
+        expected = df[col].astype(object).where(df[col].notnull(), None).tolist()
+        assert loaded[col].astype(object).where(loaded[col].notnull(), None).tolist() == expected, col
+
+
+def test_append_that_needs_wider_codes_is_refused(tmp_path):
+    df = synthetic_metadata(200, seed=5)
+    cache = DatasetCache(str(tmp_path / 'cache'))
+    cache.build(df)
+    assert {column['name']: column['storage'] for column in cache.manifest()['columns']}['Assembly_level'] == 'int8'
+
+    more = synthetic_metadata(200, seed=6)
+    more['Assembly_level'] = [f'level {i}' for i in range(len(more))]
+    try:
+        cache.append(more)
+    except ValueError as e:
+        assert 'wider' in str(e)
+    else:
+        raise AssertionError("the append should have been refused")
+
+    # the refused append left the cache as it was
+    loaded, _ = cache.load()
+    assert len(loaded) == 200
+    assert pd.Series(loaded['Assembly_level']).isin(df['Assembly_level']).all()
@@ -0,0 +1,288 @@
+"""The filter stage of the dashboard against a pandas port of the original `update_dash` filters.
+
+Every state is sent through the Dash callback endpoint like a widget change in the browser; the selected rows,
+their order (the `Selection.union` order that mimics `pd.concat`) and the text and option outputs have to match.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from benchmark import synthetic_metadata, HeadlessDashboard, COUNTRIES, SEQUENCING_TECHNOLOGIES, TITLE_WORDS, HOSTS
+from dashboard import create_app
+
+N_ROWS = 4000
+N_STATES = 150
+
+SEARCH_IDS = ['bioproject-input', 'bioproject-dropdown', 'biosample-input', 'biosample-dropdown']
+
+
+def reference_filter(df:pd.DataFrame, values:list, triggered_id:str):
+    """The filters of the original `update_dash`, with its quirks, on a copy of `df`."""
+    (selected_country, selected_assembly_level, show_annotations_from, year_range, atypical_radio, suppressed_radio, selected_sequencing_technologies,
+     coverage_range, coverage_checklist, coverage_include_null_checklist, ani_identity_range, ani_identity_include_null_checklist, ani_coverage_range,
+     ani_coverage_include_null_checklist, n50_range, l50_range, total_genes_range, total_genes_include_null_checklist, cds_range, cds_include_null_checklist,
+     non_coding_range, non_coding_include_null_checklist, pseudogene_range, pseudogene_include_null_checklist, bioproject_input, bioproject_dropdown_values,
+     biosample_input, biosample_dropdown_values, identified_host, source_category, source, sample) = values
+
+    modified_df = df.copy()
+    if selected_country != 'World':
+        modified_df = modified_df[modified_df['country_common_name'] == selected_country]
+    modified_df = modified_df[modified_df['Assembly_level'].isin(selected_assembly_level)]
+    modified_df = modified_df[modified_df['Annotation_category'].isin(show_annotations_from)]
+    modified_df = modified_df[(modified_df['Submission_year'] >= year_range[0]) & (modified_df['Submission_year'] <= year_range[1])]
+
+    atypical_output = None
+    if atypical_radio == 'no_atypical':
+        earlier_length = modified_df.shape[0]
+        modified_df = modified_df[modified_df['Assmbly_atypical?'] == 'No']
+        atypical_output = f"Number of atypical assemblies excluded: {earlier_length - modified_df.shape[0]}"
+    elif atypical_radio == 'only_atypical':
+        modified_df = modified_df[modified_df['Assmbly_atypical?'] == 'Yes']
+        atypical_output = f"Number of atypical assemblies: {modified_df.shape[0]}"
+
+    suppressed_output = None
+    if suppressed_radio == 'no_suppressed':
+        all_length = modified_df.shape[0]
+        modified_df = modified_df[modified_df['Assembly_status'] == 'current']
+        suppressed_output = f"Number of suppressed assemblies excluded: {all_length - modified_df.shape[0]}"
+    elif suppressed_radio == 'only_suppressed':
+        modified_df = modified_df[modified_df['Assembly_status'] == 'suppressed']
+        suppressed_output = f"Number of suppressed assemblies: {modified_df.shape[0]}"
+
+    if 'All' not in selected_sequencing_technologies:
+        modified_df = modified_df[modified_df['Categorized_sequencing_technologies'].isin(selected_sequencing_technologies)]
+
+    def coverage_parts():
+        return {
+            'null': modified_df[pd.isnull(modified_df['Coverage_Depth'])],
+            'above': modified_df[modified_df['Coverage_Depth'] > 5000],
+            'range': modified_df[(modified_df['Coverage_Depth'] >= coverage_range[0]) & (modified_df['Coverage_Depth'] <= coverage_range[1])],
+        }
+
+    above, include_null = '> 5000' in coverage_checklist, 'all' in coverage_include_null_checklist
+    coverage_null_text = "" if include_null else "Genomes with no coverage data are excluded."
+    parts = coverage_parts()
+    if coverage_range[0] == 0 & coverage_range[1] == 5000 and above and include_null:
+        pass
+    elif above and include_null:
+        modified_df = pd.concat([parts['null'], parts['above'], parts['range']], ignore_index=True)
+    elif above:
+        modified_df = pd.concat([parts['above'], parts['range']], ignore_index=True)
+    elif include_null:
+        modified_df = pd.concat([parts['null'], parts['range']], ignore_index=True)
+    else:
+        modified_df = parts['range']
+
+    def range_filter(column, selected_range, full_max, include_null_checklist, null_text):
+        # unfiltered range: drop the missing values unless they are included; otherwise select the range (plus the missing values)
+        nonlocal modified_df
+        null_df = modified_df[pd.isnull(modified_df[column])]
+        if selected_range[0] == 0 & selected_range[1] == full_max:
+            if 'all' in include_null_checklist:
+                return ""
+            modified_df = modified_df[pd.notnull(modified_df[column])]
+            return null_text(len(null_df))
+        selected_df = modified_df[(modified_df[column] >= selected_range[0]) & (modified_df[column] <= selected_range[1])]
+        if 'all' in include_null_checklist:
+            modified_df = pd.concat([selected_df, null_df], ignore_index=True)
+            return ""
+        modified_df = selected_df
+        return null_text(len(null_df))
+
+    ani_identity_null_text = range_filter('ANI_best_match_score', ani_identity_range, 100, ani_identity_include_null_checklist, lambda n: f"{n} Genomes with no % ANI identity data are excluded.")
+    ani_coverage_null_text = range_filter('ANI_best_matched_assembly\'s_coverage', ani_coverage_range, 100, ani_coverage_include_null_checklist, lambda n: f"{n} genomes with no % coverage data are excluded.")
+
+    if not (n50_range[0] == 0 & n50_range[1] == int(df['Contig_N50'].max())):
+        modified_df = modified_df[(modified_df['Contig_N50'] >= n50_range[0]) & (modified_df['Contig_N50'] <= n50_range[1])]
+    if not (l50_range[0] == 0 & l50_range[1] == int(df['Contig_L50'].max())):
+        modified_df = modified_df[(modified_df['Contig_L50'] >= l50_range[0]) & (modified_df['Contig_L50'] <= l50_range[1])]
+
+    total_gene_null_text = range_filter('Total_genes', total_genes_range, int(df['Total_genes'].max()), total_genes_include_null_checklist, lambda n: f"{n} genomes excluded that didn't have total gene count.")
+    cds_null_text = range_filter('Protein-coding_genes', cds_range, int(df['Protein-coding_genes'].max()), cds_include_null_checklist, lambda n: f"{n} genomes excluded that didn't have CDSs count.")
+    non_coding_null_text = range_filter('Non-coding_genes', non_coding_range, int(df['Non-coding_genes'].max()), non_coding_include_null_checklist, lambda n: f"{n} genomes excluded that didn't have non-coding gene count.")
+    pseudogene_null_text = range_filter('Pseudogenes', pseudogene_range, int(df['Pseudogenes'].max()), pseudogene_include_null_checklist, lambda n: f"{n} genomes excluded that didn't have pseudogene count")
+
+    def title_filter(column, text_input, dropdown_values, input_id, dropdown_id):
+        nonlocal modified_df
+        options = [{'label': i, 'value': i} for i in modified_df[column].unique()]
+        if text_input:
+            keywords = [word.strip().lower() for word in text_input.split(',') if word.strip()]
+            matches = [title for title in modified_df[column].tolist() if any(kw in title.lower() for kw in keywords)]
+        else:
+            dropdown = []
+            matches = []
+        if triggered_id == input_id:
+            dropdown = list(set(dropdown_values or []) | set(matches))
+        elif triggered_id == dropdown_id:
+            dropdown = list(set(dropdown_values)) or []
+        elif dropdown_values:
+            dropdown = [title for title in modified_df[column].unique() if title in dropdown_values]
+        if dropdown != []:
+            modified_df = modified_df[modified_df[column].isin(dropdown)]
+        return options, dropdown
+
+    bioproject_options, bioproject_dropdown = title_filter('Bioproject_title', bioproject_input, bioproject_dropdown_values, 'bioproject-input', 'bioproject-dropdown')
+    biosample_options, biosample_dropdown = title_filter('Biosample_title', biosample_input, biosample_dropdown_values, 'biosample-input', 'biosample-dropdown')
+
+    modified_df = modified_df[modified_df['identified_host'].isin(identified_host)]
+    source_category_options = [{'label': i, 'value': i} for i in modified_df['source_category'].unique()]
+    source_options = []
+    sample_options = []
+    if source_category:
+        modified_df = modified_df[modified_df['source_category'].isin(source_category)]
+        source_options = [{'label': i, 'value': i} for i in modified_df['source'].unique()]
+    if source:
+        modified_df = modified_df[modified_df['source'].isin(source)]
+        sample_options = [{'label': i, 'value': i} for i in modified_df['sample'].unique()]
+    if sample:
+        modified_df = modified_df[modified_df['sample'].isin(sample)]
+
+    outputs = {
+        'atypical-radio-output.children': atypical_output,
+        'suppressed-radio-output.children': suppressed_output,
+        'genome-count.value': len(modified_df),
+        'coverage-slider-output2.children': coverage_null_text,
+        'ani-identity-null-output.children': ani_identity_null_text,
+        'ani-coverage-null-output.children': ani_coverage_null_text,
+        'total-gene-null-output.children': total_gene_null_text,
+        'cds-null-output.children': cds_null_text,
+        'non-coding-null-output.children': non_coding_null_text,
+        'pseudogene-null-output.children': pseudogene_null_text,
+        'bioproject-dropdown.options': bioproject_options,
+        'bioproject-dropdown.value': bioproject_dropdown,
+        'bioproject-output.children': f"{len(modified_df['Bioproject_title'].unique())} BioProjects are selected. They contain a total of {len(modified_df)}assemblies.",
+        'biosample-dropdown.options': biosample_options,
+        'biosample-dropdown.value': biosample_dropdown,
+        'biosample-output.children': f"Selected BioSamples contain a total of {len(modified_df)} assemblies.",
+        'source-category-dropdown.options': source_category_options,
+        'source-dropdown.options': source_options,
+        'sample-dropdown.options': sample_options,
+    }
+    return modified_df, outputs
+
+
+def plain(value):
+    # NaN labels travel as null through the callback endpoint
+    if isinstance(value, dict):
+        return {k: plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [plain(v) for v in value]
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def random_subset(rng, values, p_all=0.5):
+    values = list(values)
+    if rng.random() < p_all:
+        return values
+    return [v for v in values if rng.random() < 0.6] or [values[0]]
+
+
+def random_range(rng, low, high, p_full=0.6):
+    if rng.random() < p_full:
+        return [low, high]
+    a, b = sorted(rng.uniform(low, high, size=2))
+    return [int(a), int(np.ceil(b))]
+
+
+def random_state(rng, df:pd.DataFrame, defaults:dict) -> dict:
+    """Widget values around the defaults of the page, each widget changed with some probability."""
+    state = dict(defaults)
+    if rng.random() < 0.4:
+        state['country-dropdown'] = rng.choice(['World'] + list(COUNTRIES))
+    state['assembly-level-checklist'] = random_subset(rng, defaults['assembly-level-checklist'])
+    state['annotation-checklist'] = random_subset(rng, defaults['annotation-checklist'])
+    state['submission-year-slider'] = random_range(rng, *defaults['submission-year-slider'])
+    state['atypical-radio'] = rng.choice(['all', 'no_atypical', 'only_atypical'])
+    state['suppressed-radio'] = rng.choice(['all', 'no_suppressed', 'only_suppressed'])
+    if rng.random() < 0.3:
+        state['sequencing-technology-dropdown'] = random_subset(rng, SEQUENCING_TECHNOLOGIES, p_all=0)
+
+    state['coverage-slider'] = random_range(rng, 0, 5000)
+    state['coverage-checklist'] = ['> 5000'] if rng.random() < 0.7 else []
+    for slider, checklist in [('ani-identity-slider', 'ani-identity-include-null-checklist'), ('ani-coverage-slider', 'ani-coverage-include-null-checklist'),
+                              ('total-gene-slider', 'total-gene-include-null-checklist'), ('cds-slider', 'cds-include-null-checklist'),
+                              ('non-coding-slider', 'non-coding-include-null-checklist'), ('pseudogene-slider', 'pseudogene-include-null-checklist'),
+                              ('n50-slider', None), ('l50-slider', None)]:
+        state[slider] = random_range(rng, *defaults[slider], p_full=0.8)
+        if checklist is not None:
+            state[checklist] = ['all'] if rng.random() < 0.7 else []
+    state['coverage-include-null-checklist'] = ['all'] if rng.random() < 0.7 else []
+
+    if rng.random() < 0.3:
+        state['bioproject-input'] = ', '.join(rng.choice(TITLE_WORDS, size=rng.integers(1, 3)))
+    if rng.random() < 0.2:
+        state['bioproject-dropdown'] = list(rng.choice(df['Bioproject_title'].unique(), size=3))
+    if rng.random() < 0.2:
+        state['biosample-input'] = str(rng.choice(TITLE_WORDS))
+    if rng.random() < 0.1:
+        state['biosample-dropdown'] = list(rng.choice(df['Biosample_title'].unique(), size=3))
+
+    state['identified-host-dropdown'] = random_subset(rng, HOSTS)
+    for dropdown, column in [('source-category-dropdown', 'source_category'), ('source-dropdown', 'source'), ('sample-dropdown', 'sample')]:
+        if rng.random() < 0.2:
+            state[dropdown] = list(rng.choice(df[column].dropna().unique(), size=4))
+    return state
+
+
+@pytest.fixture(scope='module')
+def dashboard(tmp_path_factory):
+    df = synthetic_metadata(N_ROWS, seed=3)
+    app = create_app(df, saving_file_path=str(tmp_path_factory.mktemp('exports')))
+    return df, app, HeadlessDashboard(app)
+
+
+def test_filter_stage_matches_pandas_reference(dashboard):
+    df, app, headless = dashboard
+    filter_output = next(output for output in app.callback_map if 'filtered-rows.data' in output)
+    input_ids = [i['id'] for i in app.callback_map[filter_output]['inputs']]
+    defaults = {component_id: headless.values.get((component_id, 'value')) for component_id in input_ids}
+    reference_df = df.assign(row=np.arange(len(df)))
+
+    rng = np.random.default_rng(11)
+    for i in range(N_STATES):
+        state = random_state(rng, df, defaults)
+        triggered_id = rng.choice(SEARCH_IDS + [None, None])
+        if triggered_id in ['bioproject-dropdown', 'biosample-dropdown'] and state[triggered_id] is None:
+            # a changed dropdown sends a list, even when it was cleared
+            state[triggered_id] = []
+        values = [state[component_id] for component_id in input_ids]
+
+        headless.values.update({(component_id, 'value'): value for component_id, value in state.items()})
+
+        try:
+            expected_df, expected = reference_filter(reference_df, values, triggered_id)
+        except UnboundLocalError:
+            # a search text without a dropdown selection, updated by another widget, failed in the original too
+            with pytest.raises(RuntimeError):
+                headless.call(filter_output, [f'{triggered_id or input_ids[0]}.value'])
+            headless.values.update({(component_id, 'value'): value for component_id, value in defaults.items()})
+            continue
+
+        headless.call(filter_output, [f'{triggered_id or input_ids[0]}.value'])
+        rows = app.selected_rows({'values': values, 'triggered_id': triggered_id})
+        np.testing.assert_array_equal(rows, expected_df['row'].to_numpy(), err_msg=f"state {i}: {state}, triggered by {triggered_id}")
+
+        for prop_id, value in expected.items():
+            actual = headless.values[tuple(prop_id.split('.'))]
+            if prop_id.endswith('dropdown.value'):
+                actual, value = sorted(actual), sorted(value)
+            assert plain(actual) == plain(value), f"{prop_id} differs for state {i}: {state}, triggered by {triggered_id}"
+
+        # the next state starts from the page again, not from this state's dropdown values
+        headless.values.update({(component_id, 'value'): value for component_id, value in defaults.items()})
+
+
+def test_union_order_follows_concat(dashboard):
+    # the coverage and null-inclusive range unions reorder the rows like `pd.concat` did, so sorted rows would not match
+    df, app, headless = dashboard
+    filter_output = next(output for output in app.callback_map if 'filtered-rows.data' in output)
+    input_ids = [i['id'] for i in app.callback_map[filter_output]['inputs']]
+    state = {component_id: headless.values.get((component_id, 'value')) for component_id in input_ids}
+    state['coverage-slider'] = [100, 1000]
+    values = [state[component_id] for component_id in input_ids]
+
+    rows = app.selected_rows({'values': values, 'triggered_id': None})
+    expected_df, _ = reference_filter(df.assign(row=np.arange(len(df))), values, None)
+    assert np.any(np.diff(rows) < 0)
+    np.testing.assert_array_equal(rows, expected_df['row'].to_numpy())
@@ -0,0 +1,64 @@
+"""Zooming the level-of-detail scatter plots, replayed like the browser would."""
+import numpy as np
+import pytest
+import dash_graphs
+import dashboard
+from benchmark import synthetic_metadata, HeadlessDashboard
+from dashboard import create_app
+
+ZOOM = {'xaxis.range[0]': 99.5, 'xaxis.range[1]': 100}
+AUTORANGE = {'xaxis.autorange': True, 'yaxis.autorange': True}
+
+
+def points(figure:dict) -> int:
+    return sum(len(trace['x']) for trace in figure['data'] if trace.get('x') is not None)
+
+
+def genomes(figure:dict) -> int:
+    # a density figure has one marker per bin, with the genomes of the bin as custom data
+    return sum(int(np.sum(trace['customdata'])) for trace in figure['data'])
+
+
+def full_figure(headless:HeadlessDashboard, df) -> dict:
+    # the figure of the page's selected rows without any zoom
+    values = [headless.values.get((i['id'], i['property'])) for i in headless.app.callback_map[next(o for o in headless.app.callback_map if 'filtered-rows.data' in o)]['inputs']]
+    rows = headless.app.selected_rows({'values': values, 'triggered_id': None})
+    return dash_graphs.ANI_scatter(df=df.iloc[rows]).to_dict()
+
+
+@pytest.fixture
+def page(tmp_path):
+    df = synthetic_metadata(3000, seed=12)
+    headless = HeadlessDashboard(create_app(df.copy(), saving_file_path=str(tmp_path)))
+    headless.change({})
+    return df, headless
+
+
+def test_new_rows_are_drawn_in_full_after_a_zoom(page):
+    df, headless = page
+    headless.change({('ani-scatter', 'relayoutData'): ZOOM})
+
+    levels = [level for level in headless.values[('assembly-level-checklist', 'value')] if level != 'Complete Genome']
+    headless.change({('assembly-level-checklist', 'value'): levels})
+    assert points(headless.values[('ani-scatter', 'figure')]) == points(full_figure(headless, df))
+
+    # the browser zooms the WebGL points itself, so a reset leaves the figure alone
+    headless.change({('ani-scatter', 'relayoutData'): AUTORANGE})
+    assert any('ani-scatter.figure' in output for output in headless.fired)
+    assert points(headless.values[('ani-scatter', 'figure')]) == points(full_figure(headless, df))
+
+
+def test_autorange_redraws_a_zoomed_density(page, monkeypatch):
+    df, headless = page
+    # the density mode for a selection of this size
+    monkeypatch.setattr(dash_graphs, 'SCATTER_POINT_LIMIT', 100)
+    monkeypatch.setattr(dashboard, 'SCATTER_POINT_LIMIT', 100)
+
+    headless.change({('ani-scatter', 'relayoutData'): ZOOM})
+    zoomed = headless.values[('ani-scatter', 'figure')]
+    assert headless.values[('ani-scatter-range', 'data')] is not None
+    assert genomes(zoomed) < genomes(full_figure(headless, df))
+
+    headless.change({('ani-scatter', 'relayoutData'): AUTORANGE})
+    assert headless.values[('ani-scatter-range', 'data')] is None
+    assert genomes(headless.values[('ani-scatter', 'figure')]) == genomes(full_figure(headless, df))
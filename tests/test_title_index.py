@@ -0,0 +1,56 @@
+import numpy as np
+from benchmark import TITLE_WORDS
+from title_index import TitleIndex
+
+TITLES = [
+    'R&D of Salmonella enterica isolates',
+    'Salmonella R & D surveillance',
+    'Escherichia coli outbreak, hospital',
+    'Klebsiella pneumoniae carbapenemase',
+    'wastewater metagenome project',
+    'Food and soil isolates',
+    'salmonella typhimurium outbreak strain',
+    np.nan,
+]
+
+
+def old_scan(titles:list, query:str) -> np.ndarray:
+    # the keyword scan the index replaced: any comma-separated keyword as a lowercase substring
+    keywords = [word.strip().lower() for word in query.split(',') if word.strip()]
+    return np.array([isinstance(title, str) and any(kw in title.lower() for kw in keywords) for title in titles])
+
+
+def matched(index:TitleIndex, query:str) -> list:
+    return [TITLES[i] for i in np.flatnonzero(index.search(query))]
+
+
+def test_plain_queries_match_the_old_scan():
+    rng = np.random.default_rng(2)
+    titles = [' '.join(rng.choice(TITLE_WORDS, size=rng.integers(2, 8))) + (' R&D' if rng.random() < 0.1 else '') for _ in range(500)]
+    index = TitleIndex(titles)
+
+    queries = ['r&d', 'R&D, coli', 'salmonella,  outbreak ', 'ella ent', 'no such title', ',', 'oli', 'a']
+    queries += [', '.join(rng.choice(TITLE_WORDS, size=2)) for _ in range(20)]
+    queries += [word[1:-1] for word in rng.choice(TITLE_WORDS, size=10)]
+    for query in queries:
+        np.testing.assert_array_equal(index.search(query), old_scan(titles, query), err_msg=query)
+
+
+def test_ampersand_inside_a_word_is_literal():
+    index = TitleIndex(TITLES)
+    assert matched(index, 'R&D') == ['R&D of Salmonella enterica isolates']
+    assert matched(index, 'r & d') == ['R&D of Salmonella enterica isolates', 'Salmonella R & D surveillance']
+
+
+def test_spaced_ampersand_requires_every_part():
+    index = TitleIndex(TITLES)
+    assert matched(index, 'salmonella & outbreak') == ['salmonella typhimurium outbreak strain']
+    assert matched(index, 'salmonella & outbreak, klebsiella') == ['Klebsiella pneumoniae carbapenemase', 'salmonella typhimurium outbreak strain']
+    assert matched(index, 'isolates & food & soil') == ['Food and soil isolates']
+
+
+def test_trailing_tilde_allows_typos():
+    index = TitleIndex(TITLES)
+    assert matched(index, 'salmonela~') == ['R&D of Salmonella enterica isolates', 'Salmonella R & D surveillance', 'salmonella typhimurium outbreak strain']
+    assert matched(index, 'salmonela') == []
+    assert matched(index, 'outbrek~ & hospital') == ['Escherichia coli outbreak, hospital']